@@ -0,0 +1,59 @@
+"""Page chrome for the app: logo, background and CSS, from local files.
+
+The background (BG.png) is read and base64-encoded once per server process
+and inlined into the CSS, so a rerun neither touches the disk nor sends the
+browser off to another site. The logo is shown from logo.png next to the
+app when it's there, else from the company site as before.
+"""
+import base64
+import os
+
+import streamlit as st
+
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKGROUND = "BG.png"
+LOGO = "logo.png"
+LOGO_URL = "https://bebpl.com/wp-content/uploads/2023/07/BLUE-ENERGY-lFINAL-LOGO.png"
+
+
+@st.cache_resource
+def load_asset(name):
+    """Bytes of a bundled asset, or None when it isn't there."""
+    try:
+        with open(os.path.join(ASSET_DIR, name), "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+@st.cache_resource
+def page_css():
+    background = load_asset(BACKGROUND)
+    image = f'url("data:image/png;base64,{base64.b64encode(background).decode()}")' if background else "none"
+    return f"""
+    <style>
+    .stApp {{
+      background-image: {image};
+      background-size: cover;
+      background-position: center;
+      color: black;
+    }}
+    .big-title {{
+      font-size: 40px;
+      font-weight: 700;
+      text-align: center;
+      padding: 20px 0;
+    }}
+    .card {{
+      background: rgba(255,255,255,0.06);
+      padding: 12px;
+      border-radius: 10px;
+    }}
+    </style>
+    """
+
+
+def page_header(title):
+    st.image(load_asset(LOGO) or LOGO_URL, width=200)
+    st.markdown(page_css(), unsafe_allow_html=True)
+    st.markdown(f'<div class="big-title">{title}</div>', unsafe_allow_html=True)
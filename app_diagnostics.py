@@ -0,0 +1,49 @@
+"""Diagnostics panel: where the time of a rerun went.
+
+Shown at the bottom of the page when the app is opened with ?diagnostics
+in the URL (or RESISTIVITY_DIAGNOSTICS is set). Timings are collected
+either way, for the perf log and the percentiles.
+"""
+import os
+import uuid
+
+import streamlit as st
+
+from geom_tables import GeomRegistry
+from instrument import STATS, rss_bytes
+from plots import PLOT_CACHE
+
+
+def perf_session():
+    """Short id of this browser session in the perf log."""
+    return st.session_state.setdefault("perf_session", uuid.uuid4().hex[:8])
+
+
+def diagnostics_enabled():
+    return "diagnostics" in st.query_params or bool(os.environ.get("RESISTIVITY_DIAGNOSTICS"))
+
+
+def _stage_rows(record):
+    return [{"stage": name, "calls": s["calls"], "ms": s["ms"], "RSS change (KB)": s["rss_delta_kb"]}
+            for name, s in sorted(record["stages"].items(), key=lambda item: -item[1]["ms"])]
+
+
+def diagnostics_panel(current, tables: GeomRegistry):
+    with st.expander("Diagnostics", expanded=True):
+        record = current.record()
+        rss = rss_bytes()
+        st.caption(f"Session {current.session} · this run so far {record['ms']:.0f} ms · "
+                   f"process RSS {'n/a' if rss is None else f'{rss / 2**20:.0f} MB'} · "
+                   f"plot cache {len(PLOT_CACHE)} charts, {PLOT_CACHE.hits} hits / {PLOT_CACHE.misses} misses · "
+                   f"tables loaded {tables.loaded()} ({tables.nbytes / 2**20:.1f} MB)")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.write("This run")
+            st.dataframe(_stage_rows(record), hide_index=True)
+            fragment = st.session_state.get("perf_fragment")
+            if fragment:
+                st.write(f"Last data entry rerun ({fragment['ms']:.0f} ms)")
+                st.dataframe(_stage_rows(fragment), hide_index=True)
+        with col2:
+            st.write("All sessions (recent samples)")
+            st.dataframe([{"stage": name, **s} for name, s in STATS.summary().items()], hide_index=True)
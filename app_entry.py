@@ -0,0 +1,338 @@
+"""Data entry and viewer.
+
+data_entry reruns on its own as a fragment: typing a station or a
+resistance, recording, importing or switching the viewed line only reruns
+this part, not the table loading, Survey Info or the export section. It
+gets the columns, the mode and the Survey Info values (survey_meta keyword
+arguments) of the last full run; changing any of them reruns the whole app
+anyway.
+
+live_sync is a second, tiny fragment that runs every LIVE_REFRESH seconds:
+it replays the journal when that's due, polls the store and shows the sync
+status. Only when it merged other crews' readings or has conflicts to report
+does it rerun the app, so an idle tablet isn't sent the entry panel and the
+viewer again every few seconds.
+"""
+import streamlit as st
+
+from app_diagnostics import perf_session
+from app_sync import (load_geometric_table, load_journal, refresh_readings, replay_journal, save_readings,
+                      show_conflicts, take_conflicts)
+from field_import import merge_profiling, merge_soundings, read_profiling_file, read_sounding_file
+from plots import profile_png, sounding_png
+from instrument import run
+from inversion import INVERSION_METHODS, invert_sounding, layer_table
+from survey_core import profiling_stations, record_profiling, record_sounding, survey_meta
+
+LIVE_REFRESH = 5
+
+
+@st.fragment(run_every=LIVE_REFRESH)
+def live_sync():
+    with run("sync", perf_session()) as current:
+        conflicts = replay_journal() if load_journal().due() else take_conflicts()
+        merged = refresh_readings()
+        queued = load_journal().depth()
+        if queued:
+            st.caption(f"🕒 {queued} reading(s) waiting to sync. They are safe in the journal and go to the survey database with the next batch.")
+        else:
+            st.caption("✅ All readings synced")
+    # data_entry shows the conflicts. In a full run it comes next anyway; a
+    # tick of its own reruns the app to get there (a fragment can only rerun
+    # itself or the whole app)
+    st.session_state.sync_conflicts = st.session_state.get("sync_conflicts", []) + conflicts
+    if current.kind == "sync" and (merged or conflicts):
+        st.rerun()
+
+
+@st.fragment
+def data_entry(col1, col2, mode, info):
+    # A rerun of just this fragment is timed as a run of its own
+    with run("fragment", perf_session()) as current:
+        _data_entry(col1, col2, mode, info)
+    if current.kind == "fragment":
+        st.session_state.perf_fragment = current.record()
+
+
+def _data_entry(col1, col2, mode, info):
+    with col1:
+        show_conflicts(st.session_state.pop("sync_conflicts", []))
+
+    # --- PROFILING WORKFLOW ---
+    if mode == "Profiling":
+        with col1:
+            st.markdown('<div class="card" style="margin-top:12px">', unsafe_allow_html=True)
+            prof_type = st.selectbox("Method", ["Gradient", "Other"])
+            C1C2 = st.number_input("Enter C1C2 distance (e.g. 300 or 400)", min_value=1.0, value=400.0, step=100.0)
+            P1P2 = st.number_input("Enter P1P2 interval (e.g. 5)", min_value=1.0, value=10.0, step=1.0)
+
+            st.subheader("Line Setup")
+            line_number = st.text_input("Line number",placeholder="L0/N50/S50/E50/W50/NE50/SW50/SE50/NW50")
+        
+        
+            #station = st.number_input("Station",value= None,placeholder="35/-35", step=5)
+        
+            def search_nums(term: str) -> list[str]:
+                options = profiling_stations(load_geometric_table(), C1C2, P1P2)
+                if not options:
+                    return []  # Return empty list if the spread has no stations
+
+                if not term:
+                    return []  # Return empty list if term is empty
+
+                term = term.lower()  # Convert term to lowercase for case-insensitive matching
+                return [n for n in options if n.lower().startswith(term)]
+           
+            from streamlit_searchbox import st_searchbox
+
+            st.markdown('###### <span style="color: darkred;">Station</span>', unsafe_allow_html=True)
+            station = st_searchbox( 
+                search_function=search_nums,
+                placeholder="-35/35",
+                key="num_search",label=None
+            )
+
+            if station is not None and station != "":
+                try:
+                    station = float(station)
+                except ValueError:
+                    st.error(f"Could not convert '{station}' to float.\n Please select proper Value")
+                    station = None
+            else:
+                station = None
+               
+            #resistance = st.number_input("Resistance (ohms)", value=0.0,format="%.5f")
+        
+            #resistance = st.text_input("Resistance (ohms)")
+        
+            resistance = st.text_input("Resistance (ohms)", key="resistance")
+        
+            try:
+                resistance = float(resistance)
+                resistance = round(resistance,6)
+            except:
+                resistance = None
+            r_mark = st.text_input("Remark")
+
+            if st.button("Record Profiling Data"):
+                if not line_number:
+                    st.error("Please enter a line number.")
+                else:
+                    gfactor, _ = record_profiling(
+                        st.session_state.lines, load_geometric_table(), line_number, station, resistance, r_mark,
+                        survey_meta(**info, method=prof_type),
+                        C1C2, P1P2, warn=st.warning)
+
+                    if resistance is None:
+                        st.error("⚠️ Please enter a proper resistance value.")
+                    elif gfactor is None:
+                        st.error(f"⚠️ No geometric factor for C1C2={C1C2:g}, line {line_number}, station {station}. Check the line number and station.")
+                    save_readings()
+                    st.success(f"Recorded/Updated station {station} in line {line_number}")
+
+            # Whole lines from the instrument's CSV/TSV export in one go
+            with st.expander("Import instrument file (CSV/TSV)"):
+                prof_file = st.file_uploader("Columns: Line, Station, Resistance, Remark (C1C2/P1P2 optional)",
+                                             type=["csv", "tsv", "txt"], key="prof_file")
+                if st.button("Import Profiling File"):
+                    if prof_file is None:
+                        st.error("Please choose a file to import.")
+                    else:
+                        try:
+                            readings = read_profiling_file(prof_file, load_geometric_table(), C1C2, P1P2)
+                        except ValueError as e:
+                            st.error(f"Could not import {prof_file.name}: {e}")
+                            readings = None
+                        if readings is not None:
+                            st.session_state.lines = merge_profiling(st.session_state.lines, readings, survey_meta(
+                                **info, method=prof_type))
+                            save_readings()
+                            st.success(f"Imported {len(readings)} readings into {readings['line'].nunique()} line(s)")
+                            no_factor = int(readings["gfactor"].isna().sum())
+                            if no_factor:
+                                st.warning(f"⚠️ {no_factor} reading(s) have no geometric factor. Check their line numbers and stations.")
+            st.markdown("</div>", unsafe_allow_html=True)
+
+    # --- SOUNDING WORKFLOW ---
+    if mode == "Sounding":
+        with col1:
+            st.markdown('<div class="card" style="margin-top:12px">', unsafe_allow_html=True)
+            ves_name = st.text_input("VES number",placeholder="VES1")
+            prof_type = st.radio("Method", ["Schlumberger", "Wenner","Dipole-Dipole"],horizontal=True)
+        
+            #C1C2_val = st.number_input("Enter C1C2 (AB spacing)", min_value=1.0, value=10.0, step=1.0)
+        
+            if prof_type == "Schlumberger":
+                AB_2 = [1,1.5,2,2.5,3,3.5,4,5,6,7,8,10,12,15,20,25,30,35,40,50,60,70,80,100,
+                        120,150,160,180,200,250,300,350,400,500,600,700,800,1000,1200,1500,
+                        1750,2000,2500,3000]
+                MN_2 = ["0.5","1","2","5","10","20","50"]
+                #C1C2_val = st.text_input("C1C2/2 (AB/2)",placeholder="1.5")
+                C1C2_val = st.selectbox("C1C2/2 (AB/2)",options=AB_2+["Other"])    
+                if C1C2_val == "Other":
+                    C1C2_val_manual = st.text_input("C1C2/2 (AB/2)",placeholder="1.5")
+                    if C1C2_val_manual:
+                        C1C2_val = C1C2_val_manual
+                try:
+                    C1C2_val = float(C1C2_val)
+                    C1C2_val = round(C1C2_val,6)
+                except:
+                    C1C2_val = None
+                        
+                #P1P2_val = st.number_input("Enter P1P2 (MN spacing)", min_value=1.0, value=1.0, step=1.0)
+            
+                #P1P2_val = st.text_input("P1P2/2 (MN/2)",placeholder="0.5")
+                P1P2_val = st.selectbox("P1P2/2 (MN/2)",options=MN_2+["Other"]) #st.text_input("P1P2/2 (MN/2)",placeholder="0.5")
+                if P1P2_val == "Other":
+                    P1P2_val_manual = st.text_input("P1P2/2 (MN/2)",placeholder="0.5")
+                    if P1P2_val_manual:
+                        P1P2_val = P1P2_val_manual
+                try:
+                    P1P2_val = float(P1P2_val)
+                    P1P2_val = round(P1P2_val,6)
+                except:
+                    P1P2_val = None
+                
+            elif prof_type == "Wenner":
+                C1C2_val = None
+                P1P2_val = st.text_input("P1P2 or a",placeholder="1")
+                try:
+                    P1P2_val = float(P1P2_val)
+                    P1P2_val = round(P1P2_val,6)
+                except:
+                    P1P2_val = None 
+                
+            elif prof_type == "Dipole-Dipole":
+            
+                C1C2_val = st.text_input("n",placeholder="1")
+                try:
+                    C1C2_val = float(C1C2_val)
+                    C1C2_val = round(C1C2_val,6)
+                except:
+                    C1C2_val = None
+                #P1P2_val = st.number_input("Enter P1P2 (MN spacing)", min_value=1.0, value=1.0, step=1.0)
+            
+                P1P2_val = st.text_input("a",placeholder="1")
+                try:
+                    P1P2_val = float(P1P2_val)
+                    P1P2_val = round(P1P2_val,6)
+                except:
+                    P1P2_val = None
+                
+        
+            #resistance = st.number_input("Resistance (ohms)", value=0.0, step=0.00001,format="%.5f")
+        
+            resistance = st.text_input("Resistance (ohms)")
+            try:
+                resistance = float(resistance)
+                resistance = round(resistance,6)
+            except:
+                resistance = None
+            r_mark = st.text_input("Remark")
+        
+            if st.button("Record Sounding Data"):
+                ves_name = ves_name or info["location"] or "VES1"
+                try:
+                    gfactor, _ = record_sounding(
+                        st.session_state.sounding, ves_name, prof_type, C1C2_val, P1P2_val, resistance, r_mark,
+                        survey_meta(**info, method=prof_type))
+                except ValueError:
+                    st.error(f"⚠️ {ves_name} is a {st.session_state.sounding[ves_name].meta['Method']} sounding. Use another VES number for {prof_type}.")
+                else:
+                    if resistance is None:
+                        st.error("⚠️ Please enter a proper resistance value.")
+                    elif gfactor is None:
+                        st.error("⚠️ Please enter proper spacing values.")
+                    save_readings()
+                    if prof_type == "Schlumberger":
+                        st.success(f"Recorded Sounding {ves_name}: C1C2/2={C1C2_val}, P1P2/2={P1P2_val}")
+                    elif prof_type == "Wenner":
+                        st.success(f"Recorded Sounding {ves_name}: a = {P1P2_val}")
+                    else:
+                        st.success(f"Recorded Sounding {ves_name}: n={C1C2_val}, a={P1P2_val}")
+
+            # A night's worth of field books: many VES per file, each with its own info
+            with st.expander("Import sounding field book (CSV/TSV/XLSX)"):
+                ves_file = st.file_uploader("Columns: VES, Method, AB/2, MN/2, a, n, Resistance, Remark",
+                                            type=["csv", "tsv", "txt", "xlsx"], key="ves_file")
+                if st.button("Import Sounding File"):
+                    if ves_file is None:
+                        st.error("Please choose a file to import.")
+                    else:
+                        try:
+                            readings = read_sounding_file(ves_file, prof_type)
+                            st.session_state.sounding = merge_soundings(st.session_state.sounding, readings, survey_meta(
+                                **info, method=prof_type))
+                        except ValueError as e:
+                            st.error(f"Could not import {ves_file.name}: {e}")
+                        else:
+                            save_readings()
+                            st.success(f"Imported {len(readings)} readings into {readings['VES'].nunique()} VES")
+                            no_factor = int(readings["gfactor"].isna().sum())
+                            if no_factor:
+                                st.warning(f"⚠️ {no_factor} reading(s) have no geometric factor. Check their spacings.")
+            
+            st.markdown("</div>", unsafe_allow_html=True)
+
+    # Right panel: view/edit data
+    with col2:
+        st.subheader("Data Viewer")
+        if mode == "Profiling":
+            if st.session_state.lines:
+                selected_line = st.selectbox("Select line to view", list(st.session_state.lines.keys()))
+                line_data = st.session_state.lines[selected_line]
+                df = line_data.frame()
+                st.write("Meta:")
+                st.json(line_data.meta)
+                st.write("Recorded Data:")
+                st.dataframe(df)
+
+                if not df.empty:
+                    st.image(profile_png(df["station"], df["resistivity"], f"Line {selected_line}"), width="stretch")
+            else:
+                st.info("No profiling lines recorded yet.")
+        elif mode == "Sounding":
+            if st.session_state.sounding:
+                selected_ves = st.selectbox("Select VES to view", list(st.session_state.sounding.keys()))
+                ves = st.session_state.sounding[selected_ves]
+                ves_method = ves.meta["Method"]
+                df = ves.frame()
+                st.write("Survey Info:")
+                st.json(ves.meta)
+                st.write("Recorded Sounding Data:")
+                st.dataframe(df)
+
+                fit = None
+                if ves_method in INVERSION_METHODS and not df.empty:
+                    fit = layered_fit(selected_ves, ves, ves_method, df)
+                if not df.empty:
+                    st.image(sounding_png(ves_method, df, fit), width="stretch")
+            else:
+                st.info("No sounding data recorded yet.")
+
+
+def layered_fit(name, ves, method, df):
+    """Layered-earth inversion of the viewed VES; returns the (spacing,
+    fitted) curve to draw, or None. Fits are kept per VES and layer count
+    and only redone when the readings change, starting from the last fit."""
+    with st.expander("Layered-earth inversion", expanded=True):
+        layers = st.selectbox("Layers", [2, 3, 4, 5], index=1, key=f"inv_layers_{name}")
+        fits = st.session_state.setdefault("inversions", {})
+        version = ves.fingerprint()
+        cached = fits.get((name, layers))
+        if cached is None or cached[0] != version:
+            try:
+                result = invert_sounding(method, df, layers)
+                if cached is not None:
+                    # a new reading rarely moves the model far: keep whichever fits better
+                    warm = invert_sounding(method, df, layers, start=cached[1]["model"])
+                    result = min(result, warm, key=lambda r: r["rms"])
+            except ValueError as e:
+                st.info(str(e))
+                return None
+            fits[(name, layers)] = cached = (version, result)
+        result = cached[1]
+        st.dataframe(layer_table(result), hide_index=True)
+        st.caption(f"RMS misfit {result['rms']:.1f}% · {result['iterations']} iterations · "
+                   f"{result['seconds'] * 1e3:.0f} ms" + ("" if result["converged"] else " · not converged"))
+        return result["spacing"], result["fitted"]
@@ -0,0 +1,48 @@
+"""Export section of the app.
+
+The export stack (xlsxwriter, and matplotlib for image charts) is imported
+when Export is first clicked, not on every page load.
+"""
+import os
+from pathlib import Path
+
+import streamlit as st
+
+
+def export_section(client, loc_name, date):
+    st.markdown("---")
+    st.header("Export to Excel")
+
+    chart_mode = st.radio(
+        "Charts", ["Excel charts", "Images"], horizontal=True,
+        help="Excel charts are drawn by Excel from the data sheets and stay editable; "
+             "Images embeds the same plots as shown above.",
+    )
+
+    if st.button("Export"):
+        if not st.session_state.lines and not st.session_state.sounding:
+            st.error("No data to export")
+        else:
+            from export import cleanup_exports, export_excel_file
+
+            bar = st.progress(0.0, text="Writing workbook...")
+            # Build the workbook on disk (constant memory); the download button
+            # only reads it back when it is clicked
+            cleanup_exports()
+            old_path = st.session_state.pop("export_path", None)
+            if old_path and os.path.exists(old_path):
+                os.remove(old_path)
+            export_path = export_excel_file(
+                st.session_state.lines,
+                st.session_state.sounding,
+                progress=lambda done, total: bar.progress(done / max(total, 1), text=f"Rendering charts {done}/{total}"),
+                charts="native" if chart_mode == "Excel charts" else "image",
+            )
+            st.session_state.export_path = export_path
+            bar.empty()
+            st.download_button(
+                "Download Excel File",
+                data=lambda: Path(export_path).read_bytes(),
+                file_name=f"{client}_{loc_name}_{date}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",icon="📥"
+            )
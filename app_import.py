@@ -0,0 +1,39 @@
+"""Import of exported workbooks, to carry on with a survey from an earlier
+export (another day, another device).
+
+workbook_import is only imported when Import is clicked.
+"""
+import streamlit as st
+
+from app_sync import save_readings
+
+
+def import_section():
+    with st.expander("Resume from exported workbooks (XLSX)"):
+        files = st.file_uploader("Workbooks written by Export", type=["xlsx"], accept_multiple_files=True,
+                                 key="workbook_files")
+        if st.button("Import Workbooks"):
+            if not files:
+                st.error("Please choose one or more workbooks to import.")
+                return
+            from workbook_import import merge_workbook, read_workbooks
+
+            lines, soundings = st.session_state.lines, st.session_state.sounding
+            imported = 0
+            with st.spinner(f"Reading {len(files)} workbook(s)..."):
+                results = read_workbooks([f.getvalue() for f in files])
+            for f, result in zip(files, results):
+                if not isinstance(result, Exception):
+                    try:
+                        lines, soundings = merge_workbook(lines, soundings, result)
+                        imported += 1
+                        continue
+                    except ValueError as e:
+                        result = e
+                st.error(f"Could not import {f.name}: {result}")
+            if imported:
+                n_lines = len(lines) - len(st.session_state.lines)
+                n_ves = len(soundings) - len(st.session_state.sounding)
+                st.session_state.lines, st.session_state.sounding = lines, soundings
+                save_readings()
+                st.success(f"Imported {imported} workbook(s): {n_lines} new line(s), {n_ves} new VES")
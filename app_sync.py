@@ -0,0 +1,101 @@
+"""Shared resources of the app and keeping a session's survey in sync.
+
+Every reading that reaches the server goes to the journal first (it
+survives a server crash or an unreachable database) and is replayed into
+surveys.db in batches, once enough has queued up or the oldest has waited
+REPLAY_MAX_AGE seconds (journal.due). So a refresh or a server restart
+doesn't lose the day's work, and the database sees one transaction per
+batch, not one per station. The data entry fragment checks on every tick.
+"""
+import sqlite3
+
+import streamlit as st
+
+from geom_tables import GeomRegistry
+from instrument import stage
+from journal import JOURNAL_DIR, Journal
+from survey_db import DB_PATH, SurveyDB, SyncState
+
+
+# geom_*.xlsx files are found at startup but each one is only read and
+# indexed the first time its C1C2 spread is used
+@st.cache_resource
+def load_geometric_table():
+    return GeomRegistry(".")
+
+
+@st.cache_resource
+def load_survey_db():
+    return SurveyDB(DB_PATH)
+
+
+@st.cache_resource
+def load_journal():
+    return Journal(JOURNAL_DIR)
+
+
+def open_survey(survey):
+    # Load the survey's lines and VES from the database when it's picked
+    # (and on a fresh session)
+    try:
+        st.session_state.lines, st.session_state.sounding, st.session_state.sync_state = load_survey_db().load_survey(survey)
+    except sqlite3.Error as e:
+        # Start empty; the survey's readings come in with the first poll that works
+        st.warning(f"⚠️ The survey database is not reachable ({e}). New readings are saved to the local journal.")
+        st.session_state.lines, st.session_state.sounding, st.session_state.sync_state = {}, {}, SyncState()
+    st.session_state.survey = survey
+
+
+def save_readings():
+    # Journal whatever changed since the last save; it goes to the database
+    # with the next batch
+    state = st.session_state.sync_state
+    versions = dict(state.versions)
+    try:
+        load_journal().append(load_survey_db().pending(st.session_state.survey, st.session_state.lines,
+                                                       st.session_state.sounding, state))
+    except OSError as e:
+        state.versions = versions
+        st.error(f"⚠️ Could not write the journal ({e}). The readings are kept in this session only.")
+        return
+    if load_journal().due():
+        show_conflicts(replay_journal())
+
+
+def replay_journal():
+    # Store queued readings (on failure they stay queued for the next try);
+    # returns this session's conflicts
+    state = st.session_state.sync_state
+    try:
+        with stage("journal_replay"):
+            applied, _ = load_journal().replay(load_survey_db().apply)
+    except sqlite3.Error:
+        return []
+    state.stored(applied)
+    return take_conflicts()
+
+
+def take_conflicts():
+    # The store keeps rejected readings per writer, so this session hears
+    # about its own even when another session's replay stored the journal
+    try:
+        return load_survey_db().take_conflicts(st.session_state.sync_state.writer)
+    except sqlite3.Error:
+        return []  # still noted; shown on the next try
+
+
+def show_conflicts(conflicts):
+    if conflicts:
+        shown = ", ".join(f"{e['name']} @ {e['key']}" for e in conflicts[:5])
+        more = f" and {len(conflicts) - 5} more" if len(conflicts) > 5 else ""
+        st.warning(f"⚠️ Another crew recorded a newer value for {shown}{more}. Their value was kept; record again to overwrite it.")
+
+
+def refresh_readings():
+    # Merge in readings other sessions saved to this survey
+    try:
+        with stage("store_poll"):
+            return load_survey_db().poll(st.session_state.survey, st.session_state.lines,
+                                         st.session_state.sounding, st.session_state.sync_state)
+    except sqlite3.Error:
+        return 0  # try again on the next refresh
@@ -0,0 +1,54 @@
+"""Shared plumbing of the command line batch tools (cli.py, batch_invert.py):
+finding the input files and running one task per file over a process pool.
+"""
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def find_files(paths, extensions, skip=None):
+    """Files named on the command line, folders searched recursively for
+    the given extensions. skip(path) leaves out files found in folders."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                found += [os.path.join(root, n) for n in sorted(names)
+                          if n.lower().endswith(extensions) and not n.startswith("~$")
+                          and not (skip and skip(os.path.join(root, n)))]
+        else:
+            found.append(path)
+    return found
+
+
+def run_tasks(tasks, worker, jobs, done, initializer=None, initargs=()):
+    """Run worker(task) for every task (a dict with a "path"), over jobs
+    processes, and call done(result) as each one finishes.
+
+    A task that raises is reported on stderr and doesn't stop the others.
+    Returns how many failed.
+    """
+    failed = 0
+
+    def report(task, call, *args):
+        nonlocal failed
+        try:
+            result = call(*args)
+        except Exception as e:
+            failed += 1
+            print(f"FAILED {task['path']}: {e}", file=sys.stderr)
+            return
+        done(result)
+
+    jobs = max(1, min(jobs, len(tasks)))
+    if jobs == 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for task in tasks:
+            report(task, worker, task)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=initializer, initargs=initargs) as pool:
+            futures = {pool.submit(worker, task): task for task in tasks}
+            for future in as_completed(futures):
+                report(futures[future], future.result)
+    return failed
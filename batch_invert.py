@@ -0,0 +1,164 @@
+"""Batch layered-earth inversion of archived VES workbooks.
+
+    python batch_invert.py WORKBOOK_OR_FOLDER... --out inversions.parquet [--layers 3 4] [--jobs 8]
+
+Every Sounding_Data sheet of every exported workbook (the create_excel
+layout, folders searched recursively) is inverted with inversion.invert,
+one workbook per worker process. The output is a single Parquet file with
+one row per VES and layer count: where it came from, its survey info, the
+fit (rms in percent, iterations, converged) and resistivity_1..N,
+thickness_1..N-1 of the model. Soundings that can't be inverted (another
+method, too few readings) get a row with the reason in "error".
+
+Each workbook's rows are first written to <out>.parts/, named after the
+file's path, size and modification time and the fit settings. A run that
+is stopped or crashes picks up where it was: workbooks with a part are not
+inverted again (unless they changed since), and --fresh starts over. The output is rebuilt from
+the parts at the end. Parquet needs pyarrow (or fastparquet) installed.
+"""
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from batch import find_files, run_tasks
+from inversion import INVERSION_METHODS, invert_sounding
+from workbook_import import read_soundings
+
+WORKBOOKS = (".xlsx",)
+META_FIELDS = ["Date", "Client", "Location", "Latitude", "Longitude", "Geology"]
+
+
+def part_name(path, settings):
+    """Checkpoint file of a workbook fitted with settings; a changed
+    workbook (or other settings) gets a new one."""
+    st = os.stat(path)
+    key = f"{os.path.abspath(path)}\0{st.st_size}\0{st.st_mtime_ns}\0{settings!r}"
+    return hashlib.blake2b(key.encode(), digest_size=12).hexdigest() + ".parquet"
+
+
+def _text(value):
+    return None if value is None or (isinstance(value, float) and np.isnan(value)) else str(value)
+
+
+def _number(value):
+    return pd.to_numeric(value, errors="coerce") if value not in (None, "") else np.nan
+
+
+def invert_rows(path, layer_counts, max_layers, **kwargs):
+    """Rows (dicts) for every VES of a workbook and every layer count."""
+    rows = []
+    for ves, (meta, df) in read_soundings(path).items():
+        method = _text(meta.get("Method"))
+        base = {"source": os.path.abspath(path), "ves": ves, "method": method}
+        for field in META_FIELDS:
+            value = meta.get(field)
+            base[field.lower()] = _number(value) if field in ("Latitude", "Longitude") else _text(value)
+        df = df.apply(pd.to_numeric, errors="coerce")
+        for layers in layer_counts:
+            row = {**base, "layers": layers, "readings": len(df), "rms": np.nan, "iterations": 0,
+                   "converged": False, "seconds": np.nan, "error": None}
+            row.update({f"resistivity_{i + 1}": np.nan for i in range(max_layers)})
+            row.update({f"thickness_{i + 1}": np.nan for i in range(max_layers - 1)})
+            try:
+                if method not in INVERSION_METHODS:
+                    raise ValueError(f"{method} soundings are not inverted")
+                result = invert_sounding(method, df, layers, **kwargs)
+            except (KeyError, ValueError) as e:
+                row["error"] = f"missing column {e}" if isinstance(e, KeyError) else str(e)
+            else:
+                row.update(rms=result["rms"], iterations=result["iterations"], converged=result["converged"],
+                           seconds=result["seconds"])
+                row.update({f"resistivity_{i + 1}": v for i, v in enumerate(result["resistivity"])})
+                row.update({f"thickness_{i + 1}": v for i, v in enumerate(result["thickness"])})
+            rows.append(row)
+    return rows
+
+
+def process_workbook(task):
+    """Worker: invert one workbook and write its part. Returns a summary."""
+    start = time.perf_counter()
+    rows = invert_rows(task["path"], task["layers"], max(task["layers"]), max_iter=task["max_iter"])
+    part = os.path.join(task["parts"], task["part"])
+    frame = pd.DataFrame(rows)
+    # the part only appears once it's complete, so a crash never leaves half of one
+    frame.to_parquet(part + ".tmp", index=False)
+    os.replace(part + ".tmp", part)
+    return {"path": task["path"], "ves": len({r["ves"] for r in rows}),
+            "failed": sum(r["error"] is not None for r in rows), "seconds": time.perf_counter() - start}
+
+
+def combine(parts, out):
+    """Write the parts into the single output file (replaced atomically)."""
+    frames = [pd.read_parquet(p) for p in parts]
+    frames = [f for f in frames if len(f)]
+    frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    frame.to_parquet(out + ".tmp", index=False)
+    os.replace(out + ".tmp", out)
+    return len(frame)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Invert the soundings of exported workbooks into one Parquet file.")
+    parser.add_argument("inputs", nargs="+", help="workbooks or folders of them")
+    parser.add_argument("-o", "--out", default="inversions.parquet", help="output file (default: inversions.parquet)")
+    parser.add_argument("--layers", type=int, nargs="+", default=[3], help="layer counts to fit (default: 3)")
+    parser.add_argument("--max-iter", type=int, default=30, help="iterations per fit (default: 30)")
+    parser.add_argument("--fresh", action="store_true", help="ignore the checkpoints of an earlier run")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: one per CPU)")
+    args = parser.parse_args(argv)
+
+    if any(n < 1 for n in args.layers):
+        parser.error("--layers must be at least 1")
+    try:
+        pd.io.parquet.get_engine("auto")
+    except ImportError as e:
+        parser.error(str(e))
+    files = find_files(args.inputs, WORKBOOKS)
+    if not files:
+        parser.error("no workbooks found")
+
+    parts = args.out + ".parts"
+    if args.fresh and os.path.isdir(parts):
+        for name in os.listdir(parts):
+            os.remove(os.path.join(parts, name))
+    os.makedirs(parts, exist_ok=True)
+    layers = sorted(set(args.layers))
+    tasks, done = [], []
+    failed = 0
+    for path in files:
+        try:
+            name = part_name(path, (layers, args.max_iter))
+        except OSError as e:
+            failed += 1
+            print(f"FAILED {path}: {e}", file=sys.stderr)
+            continue
+        done.append(os.path.join(parts, name))
+        if not os.path.exists(done[-1]):
+            tasks.append({"path": path, "part": name, "parts": parts, "layers": layers,
+                          "max_iter": args.max_iter})
+    skipped = len(done) - len(tasks)
+    if skipped:
+        print(f"{skipped} workbook(s) already inverted, resuming", file=sys.stderr)
+
+    start = time.perf_counter()
+
+    def report(r):
+        warn = f", {r['failed']} fit(s) not done" if r["failed"] else ""
+        print(f"{r['path']}: {r['ves']} VES{warn} ({r['seconds']:.1f}s)")
+
+    failed += run_tasks(tasks, process_workbook, args.jobs, report)
+
+    rows = combine([p for p in done if os.path.exists(p)], args.out)
+    print(f"{len(files) - failed}/{len(files)} workbook(s), {rows} fit(s) in {args.out} "
+          f"({time.perf_counter() - start:.1f}s)", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,333 @@
+"""Micro-benchmarks for the computation and export hot paths.
+
+    python bench.py                        # full run -> bench_results/<revision>.json
+    python bench.py --quick                # smaller sizes, a few seconds
+    python bench.py --compare bench_results/abc1234.json
+
+Times loading the geometric factor tables (cold from xlsx and from the
+.geom_cache copy), single and batch factor lookups, sounding factors,
+rebuilding DataFrames from the recorded tables, and create_excel over
+synthetic surveys of 1-200 lines and 10-1000 soundings, with the peak
+memory (tracemalloc) of the table load and of each export, and reading an
+export back with each workbook engine. Results go to a
+JSON file named after the git revision; --compare prints the ratios against
+an earlier file and exits 1 when something got slower than --threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from importlib import metadata
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(HERE, "bench_results")
+
+LINE_COUNTS = [1, 10, 50, 200]
+SOUNDING_COUNTS = [10, 100, 1000]
+QUICK_LINE_COUNTS = [1, 10]
+QUICK_SOUNDING_COUNTS = [10, 100]
+SOUNDING_READINGS = 30  # AB/2 steps per VES
+
+AB_2 = [1, 1.5, 2, 2.5, 3, 3.5, 4, 5, 6, 7, 8, 10, 12, 15, 20, 25, 30, 35, 40, 50, 60, 70, 80, 100,
+        120, 150, 160, 180, 200, 250]
+
+
+def timed(fn, repeat=5, number=1):
+    """Run fn number times per sample, repeat samples; seconds per call."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number)
+    return {"min": min(samples), "median": statistics.median(samples), "mean": statistics.fmean(samples),
+            "repeat": repeat, "number": number}
+
+
+def peak_memory(fn):
+    """Peak bytes allocated (tracemalloc) while fn runs."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+# --- synthetic surveys ---
+
+def profiling_survey(registry, n_lines, C1C2=400):
+    """n_lines lines over the spread's stations, factors from the table."""
+    from survey_core import survey_meta
+    from survey_store import line_table
+
+    table = registry.table(C1C2)
+    names = list(dict.fromkeys(table["Line"].astype(str)))
+    rng = np.random.default_rng(n_lines)
+    lines = {}
+    for i in range(n_lines):
+        name = names[i % len(names)] if i < len(names) else f"{names[i % len(names)]}_{i}"
+        rows = table[table["Line"].astype(str) == names[i % len(names)]]
+        stations = rows["Station"].to_numpy(dtype=float)
+        gfactor = rows["GeometricFactor"].to_numpy(dtype=float)
+        resistance = np.round(rng.uniform(0.1, 20, len(stations)), 4)
+        lines[name] = line_table({**survey_meta("01-01-2025", "Bench", "Synthetic", method="Gradient"),
+                                  "C1C2": C1C2, "P1P2": 10})
+        lines[name].upsert_many(stations, {"station": stations, "resistance": resistance, "gfactor": gfactor,
+                                           "resistivity": np.round(resistance * gfactor, 6),
+                                           "remarks": [""] * len(stations)})
+    return lines
+
+
+def sounding_survey(n_soundings, method="Schlumberger"):
+    from sounding import sounding_factors
+    from survey_core import survey_meta
+    from survey_store import sounding_table
+
+    ab2 = np.array(AB_2[:SOUNDING_READINGS], dtype=float)
+    mn2 = np.where(ab2 < 10, 0.5, 5.0)
+    gfactor = sounding_factors(method, ab2=ab2, mn2=mn2)
+    rng = np.random.default_rng(n_soundings)
+    soundings = {}
+    for i in range(n_soundings):
+        name = f"VES{i + 1}"
+        resistance = np.round(rng.uniform(0.01, 50, len(ab2)), 4)
+        soundings[name] = sounding_table({"VES": name, **survey_meta("01-01-2025", "Bench", "Synthetic"),
+                                          "Method": method})
+        soundings[name].upsert_many(list(zip(ab2, mn2)), {"C1C2/2": ab2, "P1P2/2": mn2, "resistance": resistance,
+                                                          "gfactor": gfactor,
+                                                          "resistivity": np.round(resistance * gfactor, 6),
+                                                          "remark": [""] * len(ab2)})
+    return soundings
+
+
+# --- benchmarks ---
+
+def bench_tables(results, quick):
+    from geom_tables import GeomRegistry
+
+    repeat = 3 if quick else 5
+    with tempfile.TemporaryDirectory() as folder:
+        shutil.copy(os.path.join(HERE, "geom_400.xlsx"), folder)
+
+        def cold():
+            shutil.rmtree(os.path.join(folder, ".geom_cache"), ignore_errors=True)
+            GeomRegistry(folder).index(400)
+
+        results["load_geometric_table.cold"] = timed(cold, repeat=repeat)
+        results["load_geometric_table.cold"]["peak_bytes"] = peak_memory(cold)
+        cold()  # leave the .geom_cache copy in place
+        results["load_geometric_table.cached"] = timed(lambda: GeomRegistry(folder).index(400), repeat=repeat)
+        results["load_geometric_table.cached"]["peak_bytes"] = peak_memory(lambda: GeomRegistry(folder).index(400))
+
+    registry = GeomRegistry(HERE)
+    table = registry.table(400)
+    rng = np.random.default_rng(0)
+    n = 1000 if quick else 10000
+    picks = rng.integers(0, len(table), n)
+    lines = table["Line"].astype(str).to_numpy()[picks]
+    stations = table["Station"].to_numpy(dtype=float)[picks]
+
+    def single():
+        for line, station in zip(lines, stations):
+            registry.lookup(400, line, station)
+
+    results["get_geometric_factor.single"] = timed(single, repeat=repeat)
+    results["get_geometric_factor.single"]["per_lookup"] = results["get_geometric_factor.single"]["median"] / n
+    results["get_geometric_factor.batch"] = timed(lambda: registry.lookup_many(400, lines, stations),
+                                                  repeat=repeat, number=10)
+    results["get_geometric_factor.batch"]["per_lookup"] = results["get_geometric_factor.batch"]["median"] / n
+    return registry
+
+
+def bench_soundings(results, quick):
+    from sounding import sounding_factor, sounding_factors
+
+    repeat = 3 if quick else 5
+    ab2 = np.tile(np.array(AB_2, dtype=float), 34 if quick else 334)
+    mn2 = np.where(ab2 < 10, 0.5, 5.0)
+
+    def single():
+        for x, y in zip(ab2[:1000], mn2[:1000]):
+            sounding_factor("Schlumberger", x, y)
+
+    results["sounding_factor.single"] = timed(single, repeat=repeat)
+    results["sounding_factor.single"]["per_reading"] = results["sounding_factor.single"]["median"] / 1000
+    results["sounding_factor.batch"] = timed(lambda: sounding_factors("Schlumberger", ab2=ab2, mn2=mn2),
+                                             repeat=repeat, number=10)
+    results["sounding_factor.batch"]["per_reading"] = results["sounding_factor.batch"]["median"] / len(ab2)
+
+
+def bench_frames(results, registry, quick):
+    repeat = 3 if quick else 5
+    lines = profiling_survey(registry, 10 if quick else 50)
+    soundings = sounding_survey(100 if quick else 1000)
+
+    def rebuild():
+        for table in lines.values():
+            table.frame()
+        for table in soundings.values():
+            table.frame()
+
+    results["frame_rebuild"] = timed(rebuild, repeat=repeat)
+    results["frame_rebuild"]["tables"] = len(lines) + len(soundings)
+    results["frame_rebuild"]["per_table"] = results["frame_rebuild"]["median"] / (len(lines) + len(soundings))
+
+
+def bench_export(results, registry, quick, charts):
+    from export import create_excel
+
+    repeat = 1 if quick else 3
+    sizes = [(n, 0) for n in (QUICK_LINE_COUNTS if quick else LINE_COUNTS)]
+    sizes += [(0, n) for n in (QUICK_SOUNDING_COUNTS if quick else SOUNDING_COUNTS)]
+    for n_lines, n_soundings in sizes:
+        lines = profiling_survey(registry, n_lines) if n_lines else {}
+        soundings = sounding_survey(n_soundings) if n_soundings else {}
+
+        def export():
+            # cache=None: every run writes every sheet, as a first export does
+            return create_excel(lines, soundings, charts=charts, cache=None)
+
+        name = f"create_excel.{charts}.lines_{n_lines}" if n_lines else f"create_excel.{charts}.soundings_{n_soundings}"
+        results[name] = timed(export, repeat=repeat)
+        results[name]["peak_bytes"] = peak_memory(export)
+        results[name]["readings"] = sum(len(t) for t in lines.values()) + sum(len(t) for t in soundings.values())
+        results[name]["workbook_bytes"] = len(export().getvalue())
+        print(f"  {name}: {results[name]['median']:.3f}s, peak {results[name]['peak_bytes'] / 2**20:.1f} MiB",
+              file=sys.stderr)
+
+
+def bench_import(results, registry, quick):
+    """read_workbook over an export of lines and soundings, per engine."""
+    from export import write_excel
+    from workbook_import import ENGINES, python_calamine, read_workbook
+
+    n_lines, n_soundings = (10, 100) if quick else (50, 1000)
+    lines, soundings = profiling_survey(registry, n_lines), sounding_survey(n_soundings)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "survey.xlsx")
+        write_excel(path, lines, soundings, cache=None)
+        for engine in ENGINES:
+            if engine == "calamine" and python_calamine is None:
+                continue
+            name = f"read_workbook.{engine}.lines_{n_lines}.soundings_{n_soundings}"
+            results[name] = timed(lambda: read_workbook(path, engine), repeat=1 if quick else 3)
+            results[name]["workbook_bytes"] = os.path.getsize(path)
+            print(f"  {name}: {results[name]['median']:.3f}s", file=sys.stderr)
+
+
+# --- results ---
+
+def revision():
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                             text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=HERE,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return rev, bool(dirty)
+
+
+def versions():
+    found = {"python": platform.python_version()}
+    for name in ("numpy", "pandas", "xlsxwriter", "matplotlib", "openpyxl", "python-calamine"):
+        try:
+            found[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            found[name] = None
+    return found
+
+
+def compare(old, new, threshold):
+    """Print new/old median ratios; returns the names slower than threshold."""
+    slower = []
+    for name in sorted(set(old["results"]) & set(new["results"])):
+        before, after = old["results"][name]["median"], new["results"][name]["median"]
+        ratio = after / before if before else float("inf")
+        flag = ""
+        if ratio > threshold:
+            slower.append(name)
+            flag = "  SLOWER"
+        elif ratio < 1 / threshold:
+            flag = "  faster"
+        print(f"{name:45s} {before * 1e3:10.3f}ms -> {after * 1e3:10.3f}ms  x{ratio:5.2f}{flag}")
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the table, factor, frame and export hot paths.")
+    parser.add_argument("-o", "--out", help="result file (default: bench_results/<revision>.json)")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes and fewer repeats")
+    parser.add_argument("--charts", default="native", choices=["native", "image"],
+                        help="chart mode of the export benchmarks (default: native)")
+    parser.add_argument("--only", nargs="+", choices=["tables", "soundings", "frames", "export", "import"],
+                        help="run only these groups")
+    parser.add_argument("--compare", metavar="BASELINE", help="earlier result file to compare with")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="slowdown ratio counted as a regression (default: 1.25)")
+    args = parser.parse_args(argv)
+
+    import plots
+    plots.WORKERS = 1  # time the export itself, not the process pool start-up
+
+    groups = args.only or ["tables", "soundings", "frames", "export", "import"]
+    results = {}
+    start = time.perf_counter()
+    from geom_tables import GeomRegistry
+    registry = GeomRegistry(HERE)
+    if "tables" in groups:
+        print("tables...", file=sys.stderr)
+        registry = bench_tables(results, args.quick)
+    if "soundings" in groups:
+        print("sounding factors...", file=sys.stderr)
+        bench_soundings(results, args.quick)
+    if "frames" in groups:
+        print("frames...", file=sys.stderr)
+        bench_frames(results, registry, args.quick)
+    if "export" in groups:
+        print("export...", file=sys.stderr)
+        bench_export(results, registry, args.quick, args.charts)
+    if "import" in groups:
+        print("import...", file=sys.stderr)
+        bench_import(results, registry, args.quick)
+
+    rev, dirty = revision()
+    report = {
+        "revision": rev,
+        "dirty": dirty,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "quick": args.quick,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "versions": versions(),
+        "seconds": time.perf_counter() - start,
+        "results": results,
+    }
+    out = args.out or os.path.join(RESULTS_DIR, f"{rev}{'-dirty' if dirty else ''}{'-quick' if args.quick else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"{len(results)} benchmarks in {report['seconds']:.1f}s -> {out}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        slower = compare(baseline, report, args.threshold)
+        if slower:
+            print(f"{len(slower)} benchmark(s) slower than x{args.threshold:g}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
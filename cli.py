@@ -0,0 +1,153 @@
+"""Headless batch processing of field files.
+
+    python cli.py FILE_OR_FOLDER... --out results/ [--plots] [--jobs 4]
+
+Every input file is one survey: it is read (profiling dump or sounding
+field book, told apart by its header), factors and resistivities are
+computed, and <out>/<file name>.xlsx is written, plus one PNG per line or
+VES in <out>/<file name>/ with --plots (line_<name>.png, ves_<name>.png).
+Files with the same name (day.csv in two folders) get day.xlsx, day_2.xlsx,
+... in the order they were found, so no output of a run overwrites another. Surveys are independent, so they're
+spread over worker processes.
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+import batch
+
+FIELD_FILES = (".csv", ".tsv", ".txt", ".xlsx")
+
+_registry = None
+
+_UNSAFE_FILENAME = re.compile(r'[\\/:*?"<>|]')
+
+
+def _init_worker(tables):
+    global _registry
+    import plots
+    from geom_tables import GeomRegistry
+
+    plots.WORKERS = 1  # already one survey per process; render charts inline
+    _registry = GeomRegistry(tables)
+
+
+def find_files(paths):
+    """Field files named on the command line, folders searched recursively.
+
+    Workbooks written by this tool (an earlier --out inside a searched
+    folder) are left out.
+    """
+    from workbook_import import is_export
+
+    return batch.find_files(paths, FIELD_FILES, skip=lambda p: p.lower().endswith(".xlsx") and is_export(p))
+
+
+def output_names(paths):
+    """A file name stem per input, unique within the run (without case)."""
+    names, used = [], set()
+    for path in paths:
+        base = name = os.path.splitext(os.path.basename(path))[0]
+        n = 1
+        while name.lower() in used:
+            n += 1
+            name = f"{base}_{n}"
+        used.add(name.lower())
+        names.append(name)
+    return names
+
+
+def process_survey(task):
+    """Worker: one field file -> workbook (and plots). Returns a summary dict."""
+    from export import write_excel
+    from plots import profile_job, render_chart, sounding_job
+    from survey_core import process_file, survey_meta
+
+    start = time.perf_counter()
+    path, out = task["path"], task["out"]
+    meta = survey_meta(date=task["date"], client=task["client"], location=task["location"])
+    lines, soundings = process_file(path, _registry, task["C1C2"], task["P1P2"], task["method"],
+                                    meta, task["kind"])
+    stem = task["name"]
+    workbook = os.path.join(out, f"{stem}.xlsx")
+    write_excel(workbook, lines, soundings, charts=task["charts"], cache=None)
+
+    if task["plots"]:
+        folder = os.path.join(out, stem)
+        os.makedirs(folder, exist_ok=True)
+        # a line and a VES may share a name
+        jobs = {}
+        for name, table in lines.items():
+            df = table.frame()
+            jobs["line", name] = profile_job(df["station"], df["resistivity"], f"Line {name}")
+        for name, table in soundings.items():
+            jobs["ves", name] = sounding_job(table.meta["Method"], table.frame())
+        used = set()
+        for (kind, name), job in jobs.items():
+            base = filename = _UNSAFE_FILENAME.sub("_", f"{kind}_{name}")
+            n = 1
+            while filename.lower() in used:  # two names that clean up the same
+                n += 1
+                filename = f"{base}_{n}"
+            used.add(filename.lower())
+            with open(os.path.join(folder, f"{filename}.png"), "wb") as f:
+                f.write(render_chart(job))
+
+    readings = sum(len(t) for t in lines.values()) + sum(len(t) for t in soundings.values())
+    no_factor = sum(int(t.frame()["gfactor"].isna().sum())
+                    for t in list(lines.values()) + list(soundings.values()))
+    return {"path": path, "workbook": workbook, "lines": len(lines), "ves": len(soundings),
+            "readings": readings, "no_factor": no_factor, "seconds": time.perf_counter() - start}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute resistivities for field files and write workbooks.")
+    parser.add_argument("inputs", nargs="+", help="field files or folders of them")
+    parser.add_argument("-o", "--out", default="results", help="output folder (default: results)")
+    parser.add_argument("--kind", choices=["profiling", "sounding"],
+                        help="file type (default: guessed from each file's header)")
+    parser.add_argument("--C1C2", type=float, default=400.0,
+                        help="C1C2 for profiling rows without one (default: 400)")
+    parser.add_argument("--P1P2", type=float, default=10.0,
+                        help="P1P2 for profiling rows without one (default: 10)")
+    parser.add_argument("--method", default="Schlumberger", choices=["Schlumberger", "Wenner", "Dipole-Dipole"],
+                        help="sounding method for rows without a Method column")
+    parser.add_argument("--charts", default="native", choices=["native", "image"],
+                        help="Excel charts or embedded PNGs in the workbooks (default: native)")
+    parser.add_argument("--plots", action="store_true", help="also write one PNG per line / VES")
+    parser.add_argument("--date", default="", help="survey date written to the meta blocks")
+    parser.add_argument("--client", default="")
+    parser.add_argument("--location", default="")
+    parser.add_argument("--tables", default=os.path.dirname(os.path.abspath(__file__)),
+                        help="folder with the geom_*.xlsx tables (default: next to this script)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: one per CPU)")
+    args = parser.parse_args(argv)
+
+    files = find_files(args.inputs)
+    if not files:
+        parser.error("no field files found")
+    os.makedirs(args.out, exist_ok=True)
+    tasks = [{"path": path, "name": name, "out": args.out, "kind": args.kind, "C1C2": args.C1C2, "P1P2": args.P1P2,
+              "method": args.method, "charts": args.charts, "plots": args.plots, "date": args.date,
+              "client": args.client, "location": args.location}
+             for path, name in zip(files, output_names(files))]
+
+    start = time.perf_counter()
+
+    def done(r):
+        warn = f", {r['no_factor']} without a factor" if r["no_factor"] else ""
+        print(f"{r['path']} -> {r['workbook']}: {r['lines']} line(s), {r['ves']} VES, "
+              f"{r['readings']} readings{warn} ({r['seconds']:.1f}s)")
+
+    failed = batch.run_tasks(tasks, process_survey, args.jobs, done, _init_worker, (args.tables,))
+
+    print(f"{len(tasks) - failed}/{len(tasks)} survey(s) processed in {time.perf_counter() - start:.1f}s",
+          file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,345 @@
+"""Excel export of the recorded profiling lines and soundings.
+
+Every line gets a <line>_data sheet (the survey info as a Field/Value block,
+then the readings) and a <line>_graph sheet; every VES gets a Sounding_Data
+and a Sounding_Graph sheet, suffixed with the VES number when there is more
+than one. Characters Excel doesn't allow in sheet names become "_", and a
+name that is taken already (after the cut to 31 characters) gets " (2)",
+" (3)", ... The line or VES itself is always in its sheet's Field/Value
+block (Line / VES), which is what re-import goes by.
+
+The graph sheets hold either native Excel charts that point at the data
+sheets (charts="native": nothing is rendered, and the charts stay editable in
+Excel) or the matplotlib PNGs from plots.render_many (charts="image").
+
+Sheets are written with xlsxwriter directly, row by row, streamed to a file
+in constant_memory mode (export_excel_file). A data sheet's XML is cached by
+the content fingerprint of its line or VES, and spliced into later exports
+instead of being written again.
+"""
+import io
+import math
+import os
+import re
+import shutil
+import tempfile
+import time
+import zipfile
+import zlib
+
+import pandas as pd
+import xlsxwriter
+from xlsxwriter.utility import quote_sheetname, xl_rowcol_to_cell
+
+from instrument import stage
+from plots import SOUNDING_AXES, PlotCache, profile_job, render_many, sounding_job
+
+CHART_MODES = ["native", "image"]
+
+CHART_SIZE = {"x_scale": 1.5, "y_scale": 1.5}
+
+# Survey dates are written the way pandas writes them
+WORKBOOK_OPTIONS = {"default_date_format": "yyyy-mm-dd"}
+
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), "resistivity_exports")
+EXPORT_MAX_AGE = 60 * 60  # seconds an export file is kept for download
+
+SHEET_NAME_MAX = 31
+_SHEET_NAME_BAD = re.compile(r"[\[\]:*?/\\]")
+
+# Zlib'd worksheet XML of data sheets, keyed by sheet name and content
+# fingerprint, so re-exports only rewrite the lines that changed
+SHEET_CACHE = PlotCache(budget_bytes=64 * 1024 * 1024)
+
+
+def _sheet_name(used, prefix="", name="", suffix=""):
+    """prefix + name + suffix as a valid sheet name not in used (a set of
+    lowercased names, which it's added to).
+
+    Only name is cleaned and cut to make it fit; Excel compares sheet names
+    without case.
+    """
+    name = _SHEET_NAME_BAD.sub("_", str(name))
+    if not prefix:
+        name = name.lstrip("'")  # a sheet name can't start with an apostrophe
+    n = 1
+    while True:
+        tag = f" ({n})" if n > 1 else ""
+        room = SHEET_NAME_MAX - len(prefix) - len(suffix) - len(tag)
+        sheet = prefix + name[:max(room, 0)] + tag + suffix
+        if sheet.lower() not in used:
+            used.add(sheet.lower())
+            return sheet
+        n += 1
+
+
+def _data_range(sheetname, startrow, df, column):
+    # [sheet, first_row, col, last_row, col] of one column of df written by
+    # _write_table: header at startrow, data below it
+    col = df.columns.get_loc(column)
+    return [sheetname, startrow + 1, col, startrow + len(df), col]
+
+
+def profile_chart(workbook, sheetname, startrow, df, title):
+    """Station vs resistivity line chart over a <line>_data sheet."""
+    chart = workbook.add_chart({"type": "scatter", "subtype": "straight_with_markers"})
+    chart.add_series({
+        "name": "Resistivity",
+        "categories": _data_range(sheetname, startrow, df, "station"),
+        "values": _data_range(sheetname, startrow, df, "resistivity"),
+        "marker": {"type": "circle", "size": 5},
+    })
+    chart.set_title({"name": title})
+    chart.set_x_axis({"name": "Station", "major_gridlines": {"visible": True}})
+    chart.set_y_axis({"name": "Resistivity"})
+    chart.set_legend({"none": True})
+    chart.set_size(CHART_SIZE)
+    return chart
+
+
+def sounding_chart(workbook, sheetname, startrow, df, method, spacing=None):
+    """Log-log spacing vs resistivity scatter over a Sounding_Data sheet.
+
+    spacing overrides the x range; Dipole-Dipole plots n x a, which isn't a
+    column of the data sheet.
+    """
+    if spacing is None:
+        spacing = _data_range(sheetname, startrow, df, "C1C2/2" if method == "Schlumberger" else "a")
+    xlabel, title = SOUNDING_AXES[method]
+    chart = workbook.add_chart({"type": "scatter", "subtype": "straight_with_markers"})
+    chart.add_series({
+        "name": "Resistivity",
+        "categories": spacing,
+        "values": _data_range(sheetname, startrow, df, "resistivity"),
+        "line": {"color": "#00008B", "width": 1.0},
+        "marker": {"type": "circle", "size": 4,
+                   "border": {"color": "red"}, "fill": {"color": "red"}},
+    })
+    gridlines = {"visible": True, "line": {"dash_type": "dash", "width": 0.5}}
+    chart.set_title({"name": title})
+    chart.set_x_axis({"name": xlabel, "log_base": 10,
+                      "major_gridlines": gridlines, "minor_gridlines": gridlines})
+    chart.set_y_axis({"name": "<----- Resistivity ----->", "log_base": 10,
+                      "major_gridlines": gridlines, "minor_gridlines": gridlines})
+    chart.set_legend({"none": True})
+    chart.set_size(CHART_SIZE)
+    return chart
+
+
+def _spacing_column(worksheet, sheetname, startrow, df):
+    # n x a for a Dipole-Dipole chart, written as formulas over the data
+    # sheet (with their values cached) in column A of the graph sheet
+    sheet = quote_sheetname(sheetname)
+    n_col = df.columns.get_loc("n")
+    a_col = df.columns.get_loc("a")
+    worksheet.write(0, 0, "n x a")
+    spacing = df["n"].to_numpy(dtype=float) * df["a"].to_numpy(dtype=float)
+    for i, value in enumerate(spacing):
+        row = startrow + 1 + i
+        formula = (f"={sheet}!{xl_rowcol_to_cell(row, n_col)}"
+                   f"*{sheet}!{xl_rowcol_to_cell(row, a_col)}")
+        worksheet.write_formula(i + 1, 0, formula, None, "" if pd.isna(value) else value)
+    return [worksheet.name, 1, 0, len(df), 0]
+
+
+def _write_row(worksheet, row, values):
+    # missing values are left blank, like df.to_excel does
+    for col, value in enumerate(values):
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            continue
+        worksheet.write(row, col, value)
+
+
+def _write_table(worksheet, meta, df):
+    """Field/Value block of meta, a blank row, then df; returns df's header row.
+
+    Rows go out strictly top to bottom, as constant_memory mode requires.
+    """
+    _write_row(worksheet, 0, ["Field", "Value"])
+    for row, item in enumerate(meta.items(), start=1):
+        _write_row(worksheet, row, item)
+    startrow = len(meta) + 2
+    _write_row(worksheet, startrow, list(df.columns))
+    columns = [df[c].astype(object).tolist() if isinstance(df[c].dtype, pd.CategoricalDtype)
+               else df[c].tolist() for c in df.columns]
+    for row, values in enumerate(zip(*columns), start=startrow + 1):
+        _write_row(worksheet, row, values)
+    return startrow
+
+
+def _data_sheet(workbook, sheetname, table, df, cache, parts, meta=None):
+    """Add the data sheet of a line or VES; returns the row of its header.
+
+    meta is the Field/Value block (the table's meta by default). With a
+    cache, a sheet already written for the same content (same fingerprint)
+    is left empty here and its XML spliced in by _splice_sheets.
+    """
+    meta = table.meta if meta is None else meta
+    worksheet = workbook.add_worksheet(sheetname)
+    startrow = len(meta) + 2
+    cached = None
+    if cache is not None:
+        # the first sheet is written as the selected tab, so that's part of the key
+        key = ("sheet", sheetname, worksheet.index == 0, meta.get("Line"), table.fingerprint())
+        cached = cache.get(key)
+        parts[f"xl/worksheets/sheet{worksheet.index + 1}.xml"] = (key, cached)
+    if cached is None:
+        _write_table(worksheet, meta, df)
+    return startrow
+
+
+def _splice_sheets(path, parts, cache):
+    """Cache the sheets written fresh into the closed workbook at path and
+    swap the cached XML in for the ones left empty."""
+    with zipfile.ZipFile(path) as book:
+        for part, (key, cached) in parts.items():
+            if cached is None:
+                cache.put(key, zlib.compress(book.read(part), 1))
+    if all(cached is None for _, cached in parts.values()):
+        return
+    spliced = path + ".part"
+    with zipfile.ZipFile(path) as src, zipfile.ZipFile(spliced, "w") as dst:
+        for info in src.infolist():
+            _, cached = parts.get(info.filename, (None, None))
+            dst.writestr(info, src.read(info) if cached is None else zlib.decompress(cached))
+    os.replace(spliced, path)
+
+
+def write_workbook(workbook, all_lines: dict, soundings: dict, progress=None, charts="native",
+                   cache=None):
+    """Write the export sheets into an xlsxwriter Workbook (not closed here).
+
+    charts is "native" (Excel charts) or "image" (rendered PNGs); progress
+    (done, total) is only called while rendering images. With a cache (a
+    constant_memory workbook only), returns the {part: (key, cached xml)} map
+    _splice_sheets needs once the workbook is closed.
+    """
+    if charts not in CHART_MODES:
+        raise ValueError(f"Unknown chart mode: {charts!r}")
+
+    images = iter(())
+    if charts == "image":
+        # Render every chart up front, in parallel, then write the sheets in order
+        jobs = []
+        for key, val in all_lines.items():
+            if len(val):
+                df = val.frame()
+                jobs.append(profile_job(df["station"], df["resistivity"], f"{key} Station vs Resistivity"))
+        for ves in soundings.values():
+            if len(ves):
+                jobs.append(sounding_job(ves.meta["Method"], ves.frame()))
+        images = iter(render_many(jobs, progress))
+
+    parts = {}
+    used = set()
+
+    # --- Profiling export ---
+    for key, val in all_lines.items():
+        sheetname = _sheet_name(used, name=key, suffix="_data")
+        # Profiling metadata, then the data below it
+        df = val.frame()
+        # a line's meta doesn't name it, and its sheet name may be cleaned or cut
+        startrow = _data_sheet(workbook, sheetname, val, df, cache, parts, {"Line": key, **val.meta})
+
+        # Add graph in a separate sheet
+        if not df.empty:
+            worksheet = workbook.add_worksheet(_sheet_name(used, name=key, suffix="_graph"))
+            if charts == "native":
+                title = f"{key} Station vs Resistivity"
+                worksheet.insert_chart("B2", profile_chart(workbook, sheetname, startrow, df, title))
+            else:
+                worksheet.insert_image("B2", f"{key}.png", {"image_data": io.BytesIO(next(images))})
+
+    # --- Sounding export with metadata ---
+    for ves_name, ves in soundings.items():
+        suffix = f"_{ves_name}" if len(soundings) > 1 else ""
+        sheetname = _sheet_name(used, "Sounding_Data", suffix)
+        # Metadata at top, then the sounding data
+        df_s = ves.frame()
+        startrow = _data_sheet(workbook, sheetname, ves, df_s, cache, parts)
+
+        # Add sounding graph in separate sheet
+        if not df_s.empty:
+            worksheet = workbook.add_worksheet(_sheet_name(used, "Sounding_Graph", suffix))
+            if charts == "native":
+                method = ves.meta["Method"]
+                spacing, anchor = None, "B2"
+                if method == "Dipole-Dipole":
+                    spacing, anchor = _spacing_column(worksheet, sheetname, startrow, df_s), "C2"
+                chart = sounding_chart(workbook, sheetname, startrow, df_s, method, spacing)
+                worksheet.insert_chart(anchor, chart)
+            else:
+                worksheet.insert_image("B2", f"sound_graph{suffix}.png",
+                                       {"image_data": io.BytesIO(next(images))})
+    return parts
+
+
+def write_excel(path, all_lines: dict, soundings: dict, progress=None, charts="native", cache=SHEET_CACHE,
+                tmpdir=None):
+    """Write the export workbook to path.
+
+    The workbook is built in constant_memory mode, so only the row being
+    written is held in memory, whatever the size of the survey. Data sheets
+    whose line or VES hasn't changed since an earlier export come from cache
+    (pass cache=None to write everything).
+    """
+    with stage("export", memory=True):
+        # xlsxwriter's row spill files go in a scratch dir removed afterwards
+        # (it doesn't delete the ones of sheets without cells)
+        with tempfile.TemporaryDirectory(dir=tmpdir or os.path.dirname(os.path.abspath(path))) as scratch:
+            workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "tmpdir": scratch,
+                                                  **WORKBOOK_OPTIONS})
+            # Give the date format its style index up front: cached sheets
+            # refer to it even when no sheet written fresh uses it
+            workbook.default_date_format._get_xf_index()
+            try:
+                parts = write_workbook(workbook, all_lines, soundings, progress, charts, cache)
+            finally:
+                workbook.close()
+        if cache is not None:
+            _splice_sheets(path, parts, cache)
+
+
+def export_excel_file(all_lines: dict, soundings: dict, progress=None, charts="native", folder=None,
+                      cache=SHEET_CACHE):
+    """write_excel to a new file under folder (EXPORT_DIR by default) and
+    return its path. The caller owns the file; cleanup_exports removes old
+    ones."""
+    folder = folder or EXPORT_DIR
+    os.makedirs(folder, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=".xlsx", dir=folder)
+    os.close(fd)
+    try:
+        write_excel(path, all_lines, soundings, progress, charts, cache)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+def create_excel(all_lines: dict, soundings: dict, progress=None, charts="native", cache=SHEET_CACHE):
+    """The export workbook as a BytesIO (built on disk by export_excel_file)."""
+    path = export_excel_file(all_lines, soundings, progress, charts, cache=cache)
+    try:
+        with open(path, "rb") as f:
+            return io.BytesIO(f.read())
+    finally:
+        os.remove(path)
+
+
+def cleanup_exports(max_age=EXPORT_MAX_AGE, folder=None):
+    """Delete export files older than max_age seconds."""
+    folder = folder or EXPORT_DIR
+    if not os.path.isdir(folder):
+        return
+    cutoff = time.time() - max_age
+    for entry in os.scandir(folder):
+        try:
+            if entry.stat().st_mtime >= cutoff:
+                continue
+            if entry.is_dir():
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                os.remove(entry.path)
+        except OSError:
+            pass  # in use or already gone
@@ -0,0 +1,281 @@
+"""Bulk import of instrument dumps and field books into the app's session layout.
+
+A profiling file (CSV/TSV or XLSX) has one reading per row with at least
+Line, Station and Resistance columns; Remark(s), C1C2 and P1P2 are optional (the values set in
+the app are used when a file has no C1C2/P1P2).
+
+A sounding field book (CSV/TSV or XLSX) has one reading per row, tagged with
+the VES it belongs to, and the spacing columns of its method: AB/2 and MN/2
+(Schlumberger), a (Wenner) or n and a (Dipole-Dipole). Method, Date,
+Location, Latitude, ... columns are optional and may differ per VES.
+
+Header names are matched case-insensitively, with a few common aliases.
+"""
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from sounding import METHODS, apparent_resistivity, sounding_values
+from survey_store import SOUNDING_SPACING, SOUNDING_TEXT, line_table, sounding_table
+
+CHUNK_ROWS = 5000
+
+PROFILING_COLUMNS = {
+    "line": ["line", "line number", "line_number", "line no", "profile"],
+    "station": ["station", "stn", "station (m)", "x"],
+    "resistance": ["resistance", "resistance (ohms)", "r", "ohm", "ohms"],
+    "remarks": ["remarks", "remark", "comment", "note"],
+    "C1C2": ["c1c2", "ab"],
+    "P1P2": ["p1p2", "mn"],
+}
+
+
+SOUNDING_COLUMNS = {
+    "VES": ["ves", "ves no", "ves no.", "ves_no", "ves number", "sounding"],
+    "Method": ["method", "array"],
+    "C1C2/2": ["c1c2/2", "ab/2", "ab2"],
+    "P1P2/2": ["p1p2/2", "mn/2", "mn2"],
+    "a": ["a"],
+    "n": ["n"],
+    "resistance": ["resistance", "resistance (ohms)", "r", "ohm", "ohms"],
+    "remark": ["remark", "remarks", "comment", "note"],
+    # per-VES survey info, same names as the app's metadata
+    "Date": ["date"],
+    "Client": ["client"],
+    "Location": ["location", "village"],
+    "Latitude": ["latitude", "lat"],
+    "Longitude": ["longitude", "long", "lon"],
+    "Geology": ["geology"],
+    "Soil Type/Color": ["soil type/color", "soil type", "soil"],
+    "Line direction": ["line direction", "direction"],
+}
+
+SOUNDING_META = ["Date", "Client", "Location", "Latitude", "Longitude",
+                 "Geology", "Soil Type/Color", "Line direction", "Method"]
+
+def _sniff_sep(first_line):
+    for sep in ("\t", ";", ","):
+        if sep in first_line:
+            return sep
+    return ","
+
+
+def _open(source):
+    """(buffer, separator, opened_here) for a path, bytes or an uploaded file."""
+    opened = False
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    elif isinstance(source, str):
+        source = open(source, "rb")
+        opened = True
+    pos = source.tell()
+    head = source.read(4096)
+    source.seek(pos)
+    if isinstance(head, bytes):
+        head = head.decode("utf-8-sig", errors="replace")
+    return source, _sniff_sep(head.splitlines()[0] if head else ""), opened
+
+
+def _rename(df, columns):
+    lookup = {alias: name for name, aliases in columns.items() for alias in aliases}
+    renamed = {}
+    for col in df.columns:
+        key = str(col).strip().lower()
+        if key in lookup and lookup[key] not in renamed.values():
+            renamed[col] = lookup[key]
+    return df.rename(columns=renamed)[list(renamed.values())]
+
+
+def read_table_chunks(source, columns, chunksize=CHUNK_ROWS):
+    """Yield DataFrames of at most chunksize rows with canonical column names."""
+    buf, sep, opened = _open(source)
+    try:
+        reader = pd.read_csv(buf, sep=sep, chunksize=chunksize, dtype=str,
+                             skipinitialspace=True, encoding="utf-8-sig")
+        for chunk in reader:
+            yield _rename(chunk, columns)
+    finally:
+        if opened:
+            buf.close()
+
+
+def _is_excel(source, filename):
+    filename = filename or getattr(source, "name", None) or (source if isinstance(source, str) else "")
+    return str(filename).lower().endswith((".xlsx", ".xls"))
+
+
+def file_kind(source, filename=None):
+    """"profiling" or "sounding", from a file's header row."""
+    filename = filename or getattr(source, "name", None) or (source if isinstance(source, str) else "")
+    if _is_excel(source, filename):
+        header = pd.read_excel(source, nrows=0).columns
+    else:
+        buf, sep, opened = _open(source)
+        try:
+            header = pd.read_csv(buf, sep=sep, nrows=0, encoding="utf-8-sig").columns
+        finally:
+            if opened:
+                buf.close()
+            else:
+                buf.seek(0)
+    if [str(c) for c in header[:2]] == ["Field", "Value"]:
+        raise ValueError(f"{filename} is an exported workbook, not a field file")
+    empty = pd.DataFrame(columns=header)
+    if {"line", "station"} <= set(_rename(empty, PROFILING_COLUMNS).columns):
+        return "profiling"
+    if {"C1C2/2", "a", "VES"} & set(_rename(empty, SOUNDING_COLUMNS).columns):
+        return "sounding"
+    raise ValueError(f"Can't tell whether {filename} holds profiling or sounding readings")
+
+
+def _clean_profiling(chunk, C1C2, P1P2):
+    missing = {"line", "station", "resistance"} - set(chunk.columns)
+    if missing:
+        raise ValueError(f"Profiling file is missing column(s): {', '.join(sorted(missing))}")
+
+    out = pd.DataFrame({
+        "line": chunk["line"].fillna("").astype(str).str.strip(),
+        "station": pd.to_numeric(chunk["station"], errors="coerce"),
+        "resistance": pd.to_numeric(chunk["resistance"], errors="coerce").round(6),
+        "remarks": chunk["remarks"].fillna("") if "remarks" in chunk else "",
+    })
+    out["C1C2"] = pd.to_numeric(chunk["C1C2"], errors="coerce").fillna(C1C2) if "C1C2" in chunk else C1C2
+    out["P1P2"] = pd.to_numeric(chunk["P1P2"], errors="coerce").fillna(P1P2) if "P1P2" in chunk else P1P2
+    # rows without a line or station can't be placed anywhere
+    return out[(out["line"] != "") & out["station"].notna()]
+
+
+def read_profiling_file(source, registry, C1C2, P1P2, chunksize=CHUNK_ROWS, filename=None):
+    """Parse a profiling dump and attach gfactor/resistivity to every row.
+
+    A CSV/TSV is read in chunks (an XLSX in one go) and each chunk is joined
+    against the factor tables (registry.factors) in one vectorized call.
+    """
+    if _is_excel(source, filename):
+        chunks = [_rename(pd.read_excel(source, dtype=str), PROFILING_COLUMNS)]
+    else:
+        chunks = read_table_chunks(source, PROFILING_COLUMNS, chunksize)
+    frames = []
+    for chunk in chunks:
+        rows = _clean_profiling(chunk, C1C2, P1P2)
+        if rows.empty:
+            continue
+        rows["gfactor"] = registry.factors(
+            rows["C1C2"].to_numpy(), rows["P1P2"].to_numpy(),
+            rows["line"].to_numpy(), rows["station"].to_numpy())
+        rows["resistivity"] = apparent_resistivity(rows["resistance"], rows["gfactor"])
+        frames.append(rows)
+    if not frames:
+        return pd.DataFrame(columns=["line", "station", "resistance", "remarks",
+                                     "C1C2", "P1P2", "gfactor", "resistivity"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def _none_if_nan(value):
+    return None if pd.isna(value) else float(value)
+
+
+def sounding_keys(method, columns):
+    """Row keys of a VES's readings, (C1C2_val, P1P2_val) as the Record
+    Sounding handler makes them, from its spacing columns (name -> values)."""
+    values = [np.asarray(columns[c], dtype=float) for c in SOUNDING_SPACING[method]]
+    if method == "Wenner":
+        return [(None, _none_if_nan(a)) for a in values[0]]
+    return [(_none_if_nan(n), _none_if_nan(a)) for n, a in zip(*values)]
+
+
+def merge_profiling(lines, readings, meta):
+    """Return a copy of st.session_state.lines with the readings merged in.
+
+    meta holds the survey info used for lines that don't exist yet; C1C2 and
+    P1P2 are taken from each line's first reading. Later rows for the same
+    (line, station) win, just like recording the station again.
+    """
+    merged = dict(lines)
+    for line, group in readings.groupby("line", sort=False):
+        if line in merged:
+            table = merged[line].copy()
+        else:
+            table = line_table({**meta, "C1C2": float(group["C1C2"].iloc[0]),
+                                "P1P2": float(group["P1P2"].iloc[0])})
+        stations = group["station"].to_numpy(dtype=float)
+        table.upsert_many(stations.tolist(), {
+            "station": stations,
+            "resistance": group["resistance"].to_numpy(dtype=float),
+            "gfactor": group["gfactor"].to_numpy(dtype=float),
+            "resistivity": group["resistivity"].to_numpy(dtype=float),
+            "remarks": group["remarks"],
+        })
+        merged[line] = table
+    return merged
+
+
+def read_sounding_file(source, method, filename=None):
+    """Parse a VES field book and attach gfactor/resistivity to every row.
+
+    method is used for rows (or files) without a Method column. Factors are
+    computed with one vectorized call per array type.
+    """
+    filename = filename or getattr(source, "name", None) or (source if isinstance(source, str) else "")
+    if _is_excel(source, filename):
+        book = pd.read_excel(source, dtype=str)
+        chunks = [_rename(book, SOUNDING_COLUMNS)]
+    else:
+        chunks = read_table_chunks(source, SOUNDING_COLUMNS)
+    df = pd.concat(list(chunks), ignore_index=True)
+
+    if "resistance" not in df:
+        raise ValueError("Sounding file is missing column: resistance")
+    if "VES" not in df:
+        df["VES"] = os.path.splitext(os.path.basename(str(filename)))[0] or "VES1"
+    df["VES"] = df["VES"].ffill().fillna("VES1").astype(str).str.strip()
+    df["Method"] = df["Method"].fillna(method).str.strip() if "Method" in df else method
+    unknown = set(df["Method"]) - set(METHODS)
+    if unknown:
+        raise ValueError(f"Unknown sounding method(s): {', '.join(sorted(unknown))}")
+
+    for col in ("C1C2/2", "P1P2/2", "a", "n", "resistance"):
+        df[col] = pd.to_numeric(df[col], errors="coerce") if col in df else np.nan
+    df["resistance"] = df["resistance"].round(6)
+    df["remark"] = df["remark"].fillna("") if "remark" in df else ""
+
+    df["gfactor"] = df["resistivity"] = np.nan
+    for name, rows in df.groupby("Method").groups.items():
+        part = df.loc[rows]
+        df.loc[rows, "gfactor"], df.loc[rows, "resistivity"] = sounding_values(
+            name, part["resistance"], ab2=part["C1C2/2"], mn2=part["P1P2/2"], a=part["a"], n=part["n"])
+    return df
+
+
+def merge_soundings(soundings, readings, meta):
+    """Return a copy of st.session_state.sounding with the readings merged in.
+
+    Each VES keeps its own metadata: columns present in the file win over the
+    survey info in meta. Readings are keyed by (C1C2_val, P1P2_val) inside
+    their VES, like the Record Sounding handler does.
+    """
+    merged = dict(soundings)
+    for ves, group in readings.groupby("VES", sort=False):
+        first = group.iloc[0]
+        method = first["Method"]
+        if ves in merged:
+            table = merged[ves].copy()
+            if table.meta["Method"] != method:
+                raise ValueError(f"{ves} is already recorded as {table.meta['Method']}, not {method}")
+        else:
+            ves_meta = {"VES": ves}
+            for field in SOUNDING_META:
+                value = first[field] if field in group else None
+                if value is None or pd.isna(value):
+                    value = meta.get(field)
+                elif field in ("Latitude", "Longitude"):
+                    value = _none_if_nan(pd.to_numeric(value, errors="coerce"))
+                ves_meta[field] = value
+            ves_meta["Method"] = method
+            table = sounding_table(ves_meta)
+
+        table.upsert_many(sounding_keys(method, group), {c: group[c] for c in table.columns + [SOUNDING_TEXT]})
+        merged[ves] = table
+    return merged
@@ -0,0 +1,346 @@
+"""Geometric factor tables for gradient profiling.
+
+The geom_<C1C2>.xlsx tables hold one row per (Line, Station) with the
+GeometricFactor for that C1C2 spread. GeomIndex flattens all of them into a
+single hash index so a lookup no longer scans the DataFrames.
+
+Parsing xlsx is slow, so read_geom_table keeps a column-per-file .npy copy of
+each table in .geom_cache/ next to the source and reads that (memory mapped)
+as long as the source file is unchanged.
+
+GeomRegistry finds the tables in a folder (every geom_*.xlsx, plus
+sound_geom.xlsx as "sounding") and only reads and indexes a spread the first
+time it is asked for, dropping the least recently used ones once the loaded
+tables go over a memory budget.
+"""
+import glob
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from gradient import TABLE_P1P2, gradient_factors_at
+from instrument import stage
+
+CACHE_DIR = ".geom_cache"
+
+
+def _file_sha1(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _cache_path(path):
+    folder, name = os.path.split(os.path.abspath(path))
+    return os.path.join(folder, CACHE_DIR, os.path.splitext(name)[0])
+
+
+def _read_cache(path, st_src):
+    cache = _cache_path(path)
+    try:
+        with open(os.path.join(cache, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if (meta.get("size"), meta.get("mtime_ns")) != (st_src.st_size, st_src.st_mtime_ns):
+        # mtime moves on checkouts/copies; only a content change invalidates
+        if meta.get("size") != st_src.st_size or meta.get("sha1") != _file_sha1(path):
+            return None
+        meta["mtime_ns"] = st_src.st_mtime_ns
+        try:
+            with open(os.path.join(cache, "meta.json"), "w") as f:
+                json.dump(meta, f)
+        except OSError:
+            pass
+
+    try:
+        data = {col: np.load(os.path.join(cache, f"{i}.npy"), mmap_mode="r")
+                for i, col in enumerate(meta["columns"])}
+    except (OSError, ValueError):
+        return None
+    return pd.DataFrame(data, columns=meta["columns"])
+
+
+def _write_cache(path, st_src, df):
+    cache = _cache_path(path)
+    root = os.path.dirname(cache)
+    tmp = None
+    try:
+        os.makedirs(root, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=root)
+        for i, col in enumerate(df.columns):
+            values = df[col].to_numpy()
+            if values.dtype == object or not isinstance(values.dtype, np.dtype):
+                values = values.astype(str)
+            np.save(os.path.join(tmp, f"{i}.npy"), values, allow_pickle=False)
+        meta = {
+            "columns": [str(c) for c in df.columns],
+            "size": st_src.st_size,
+            "mtime_ns": st_src.st_mtime_ns,
+            "sha1": _file_sha1(path),
+        }
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        shutil.rmtree(cache, ignore_errors=True)
+        os.replace(tmp, cache)
+    except OSError:
+        # read-only checkout: just go without a cache
+        if tmp:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+def read_geom_table(path):
+    """pd.read_excel(path), served from the binary cache when it is current."""
+    st_src = os.stat(path)
+    df = _read_cache(path, st_src)
+    if df is None:
+        df = pd.read_excel(path)
+        _write_cache(path, st_src, df)
+    return df
+
+
+def _line_key(line):
+    return str(line).strip().upper()
+
+
+class GeomIndex:
+    """(C1C2, Line, Station) -> GeometricFactor, built once from the loaded tables."""
+
+    def __init__(self, tables: dict):
+        frames = []
+        for c1c2, df in tables.items():
+            if c1c2 == "sounding" or df.empty:
+                continue
+            frames.append(pd.DataFrame({
+                "C1C2": int(c1c2),
+                "Line": df["Line"].map(_line_key),
+                "Station": df["Station"].astype(float),
+                "GeometricFactor": df["GeometricFactor"].astype(float),
+            }))
+        flat = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+            {"C1C2": [], "Line": [], "Station": [], "GeometricFactor": []})
+
+        # rows with no factor in the sheet (blank cells) stay in as NaN, so a
+        # blank cell can be told from a station the table doesn't list; a
+        # duplicate key takes its first filled-in row
+        blank = flat["GeometricFactor"].isna()
+        flat = flat.iloc[np.argsort(blank.to_numpy(), kind="stable")].drop_duplicates(["C1C2", "Line", "Station"])
+        self.values = flat["GeometricFactor"].to_numpy(dtype=float)
+        self._index = pd.MultiIndex.from_arrays(
+            [flat["C1C2"].astype(int), flat["Line"], flat["Station"]])
+        self._pos = {key: i for i, key in enumerate(self._index)}
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def nbytes(self):
+        return (self.values.nbytes + self._index.memory_usage(deep=True)
+                + sys.getsizeof(self._pos))
+
+    def __contains__(self, key):
+        C1C2, line, station = key
+        return (int(C1C2), _line_key(line), float(station)) in self._pos
+
+    def spreads(self):
+        return sorted(set(self._index.get_level_values(0)))
+
+    def lookup(self, C1C2, line, station):
+        """Factor for one station, or None when the table has no such entry
+        or its cell is blank."""
+        if C1C2 is None or line is None or station is None:
+            return None
+        i = self._pos.get((int(C1C2), _line_key(line), float(station)))
+        if i is None or np.isnan(self.values[i]):
+            return None
+        return float(self.values[i])
+
+    def _positions(self, C1C2, lines, stations):
+        lines = pd.Series(lines, dtype=object).map(_line_key).to_numpy()
+        stations = pd.to_numeric(pd.Series(stations), errors="coerce").to_numpy(dtype=float)
+        c1c2 = np.broadcast_to(np.asarray(C1C2, dtype=float), stations.shape).astype(int)
+        return self._index.get_indexer(pd.MultiIndex.from_arrays([c1c2, lines, stations]))
+
+    def listed_many(self, C1C2, lines, stations):
+        """Whether the table has a row for each station (blank factor or not)."""
+        return self._positions(C1C2, lines, stations) >= 0
+
+    def lookup_many(self, C1C2, lines, stations):
+        """Vectorized lookup; misses and blank cells come back as NaN.
+
+        C1C2 may be a scalar or an array the same length as lines/stations.
+        """
+        pos = self._positions(C1C2, lines, stations)
+        out = np.full(len(pos), np.nan)
+        hit = pos >= 0
+        out[hit] = self.values[pos[hit]]
+        return out
+
+
+class GeomRegistry:
+    """Lazily loaded geometric factor tables keyed by C1C2 (or "sounding")."""
+
+    def __init__(self, folder=".", budget_bytes=64 * 1024 * 1024):
+        self.folder = folder
+        self.budget_bytes = budget_bytes
+        self._loaded = OrderedDict()  # key -> (table, GeomIndex, nbytes), LRU order
+        self._lock = threading.Lock()
+        self.paths = self.discover()
+
+    def discover(self):
+        """Map table key -> xlsx path for the files present in the folder."""
+        paths = {}
+        for path in sorted(glob.glob(os.path.join(self.folder, "geom_*.xlsx"))):
+            suffix = os.path.splitext(os.path.basename(path))[0][len("geom_"):]
+            try:
+                paths[int(suffix)] = path
+            except ValueError:
+                continue
+        sounding = os.path.join(self.folder, "sound_geom.xlsx")
+        if os.path.exists(sounding):
+            paths["sounding"] = sounding
+        return paths
+
+    @staticmethod
+    def _key(C1C2):
+        if C1C2 == "sounding":
+            return C1C2
+        try:
+            return int(C1C2)
+        except (TypeError, ValueError):
+            return None
+
+    def __contains__(self, C1C2):
+        return self._key(C1C2) in self.paths
+
+    def spreads(self):
+        return sorted(k for k in self.paths if k != "sounding")
+
+    def loaded(self):
+        return list(self._loaded)
+
+    @property
+    def nbytes(self):
+        return sum(entry[2] for entry in self._loaded.values())
+
+    def _entry(self, C1C2):
+        key = self._key(C1C2)
+        if key not in self.paths:
+            return None
+        with self._lock:
+            entry = self._loaded.get(key)
+            if entry is not None:
+                self._loaded.move_to_end(key)
+                return entry
+
+            with stage("table_load", memory=True):
+                table = read_geom_table(self.paths[key])
+                index = GeomIndex({key: table})
+            nbytes = int(table.memory_usage(deep=True).sum()) + index.nbytes
+            entry = self._loaded[key] = (table, index, nbytes)
+            self._evict(keep=key)
+            return entry
+
+    def _evict(self, keep=None):
+        while self.nbytes > self.budget_bytes and len(self._loaded) > 1:
+            key = next(iter(self._loaded))
+            if key == keep:
+                self._loaded.move_to_end(key)
+                key = next(iter(self._loaded))
+            del self._loaded[key]
+
+    def evict(self, C1C2=None):
+        """Drop one loaded table, or all of them."""
+        with self._lock:
+            if C1C2 is None:
+                self._loaded.clear()
+            else:
+                self._loaded.pop(self._key(C1C2), None)
+
+    def table(self, C1C2):
+        entry = self._entry(C1C2)
+        return None if entry is None else entry[0]
+
+    def index(self, C1C2):
+        entry = self._entry(C1C2)
+        return None if entry is None else entry[1]
+
+    def stations(self, C1C2):
+        """Station labels of a spread in table order, e.g. ["5", "15", ..., "-5"]."""
+        table = self.table(C1C2)
+        if table is None or table.empty:
+            return []
+        return [f"{s:g}" for s in pd.unique(table["Station"].astype(float))]
+
+    def lookup(self, C1C2, line, station):
+        index = self.index(C1C2)
+        if index is None:
+            return None
+        return index.lookup(C1C2, line, station)
+
+    def listed(self, C1C2, line, station):
+        """Whether the spread's table has a row for the station (blank or not)."""
+        index = self.index(C1C2)
+        if index is None or line is None or station is None:
+            return False
+        return (C1C2, line, station) in index
+
+    def _per_spread(self, method, C1C2, lines, stations, empty):
+        # run a GeomIndex method over the rows of each spread
+        stations = pd.to_numeric(pd.Series(stations), errors="coerce").to_numpy(dtype=float)
+        lines = np.asarray(pd.Series(lines, dtype=object))
+        c1c2 = np.broadcast_to(np.asarray(C1C2, dtype=float), stations.shape)
+        out = np.full(len(stations), empty)
+        for value in pd.unique(c1c2[~np.isnan(c1c2)]):
+            index = self.index(value)
+            if index is None:
+                continue
+            rows = c1c2 == value
+            out[rows] = getattr(index, method)(value, lines[rows], stations[rows])
+        return out
+
+    def lookup_many(self, C1C2, lines, stations):
+        return self._per_spread("lookup_many", C1C2, lines, stations, np.nan)
+
+    def listed_many(self, C1C2, lines, stations):
+        return self._per_spread("listed_many", C1C2, lines, stations, False)
+
+    def factors(self, C1C2, P1P2, lines, stations):
+        """Profiling factors for many readings at once.
+
+        Rows measured with the tables' P1P2 on a spread that has a table are
+        joined against it, and stay NaN for lines or stations it doesn't
+        list; blank cells of the table, other spreads and other P1P2 are
+        computed from the electrode geometry. NaN where neither gives a
+        factor.
+        """
+        with stage("geom_factor.batch"):
+            stations = pd.to_numeric(pd.Series(stations), errors="coerce").to_numpy(dtype=float)
+            lines = np.asarray(pd.Series(lines, dtype=object))
+            c1c2 = np.broadcast_to(np.asarray(C1C2, dtype=float), stations.shape)
+            p1p2 = np.broadcast_to(np.asarray(P1P2, dtype=float), stations.shape)
+
+            out = np.full(len(stations), np.nan)
+            spreads = [v for v in pd.unique(c1c2[~np.isnan(c1c2)]) if v in self]
+            tabled = (p1p2 == TABLE_P1P2) & np.isin(c1c2, spreads)
+            computed = ~tabled
+            if tabled.any():
+                out[tabled] = self.lookup_many(c1c2[tabled], lines[tabled], stations[tabled])
+                blank = tabled & np.isnan(out)
+                if blank.any():
+                    computed[blank] = self.listed_many(c1c2[blank], lines[blank], stations[blank])
+            if computed.any():
+                out[computed] = gradient_factors_at(
+                    c1c2[computed], p1p2[computed], lines[computed], stations[computed])
+            return out
@@ -0,0 +1,137 @@
+"""Gradient array geometric factors computed from electrode geometry.
+
+Current electrodes C1/C2 sit at -C1C2/2 and +C1C2/2 on the base line L0.
+A station is the midpoint of the P1P2 dipole, measured along the line, and a
+profiling line such as N50 or SW100 runs parallel to L0 at that offset (50 m,
+100 m). The factor is the exact four-electrode one,
+
+    K = 2*pi / |1/C1P1 - 1/C2P1 - 1/C1P2 + 1/C2P2|
+
+so any C1C2/P1P2 combination works, not just the spreads that have a
+geom_<C1C2>.xlsx table.
+
+Factors on the standard layout (L0 and the lines every 10 m out to 100 m,
+at the default stations) are computed once per (C1C2, P1P2) as a grid and
+looked up from it; readings off that grid are computed one by one.
+
+Run this file directly to compare the engine with the shipped tables.
+"""
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+TABLE_P1P2 = 10.0  # P1P2 the geom_*.xlsx tables were made for
+
+# Stations run out to where P2 reaches 87% of C1C2/2, which reproduces the
+# station lists of the 200, 300 and 400 m tables
+EDGE_FRACTION = 0.87
+
+GRID_OFFSETS = np.arange(0.0, 101.0, 10.0)  # L0, then N10 ... N100 and the like
+
+_LINE_RE = re.compile(r"^\s*[A-Za-z]*\s*(\d+(?:\.\d*)?)\s*$")
+
+
+def line_offset(line):
+    """Perpendicular offset of a line from L0: "L0" -> 0.0, "NE50" -> 50.0, junk -> None."""
+    if line is None:
+        return None
+    m = _LINE_RE.match(str(line))
+    return float(m.group(1)) if m else None
+
+
+def default_stations(C1C2, P1P2=TABLE_P1P2):
+    """Station midpoints for a spread: P1P2/2, 3*P1P2/2, ... then the negative side."""
+    half = P1P2 / 2
+    pos = np.arange(half, EDGE_FRACTION * C1C2 / 2 - half + 1e-9, P1P2)
+    return np.concatenate([pos, -pos])
+
+
+def _factors(C1C2, P1P2, y, x):
+    # elementwise over broadcast y (line offset) and x (station)
+    L = np.asarray(C1C2, dtype=float) / 2
+    p1 = x - np.asarray(P1P2, dtype=float) / 2
+    p2 = x + np.asarray(P1P2, dtype=float) / 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        g = (1 / np.hypot(p1 + L, y) - 1 / np.hypot(p1 - L, y)
+             - 1 / np.hypot(p2 + L, y) + 1 / np.hypot(p2 - L, y))
+        k = 2 * np.pi / np.abs(g)
+    k[~np.isfinite(k)] = np.nan
+    return k
+
+
+@lru_cache(maxsize=32)
+def gradient_grid(C1C2, P1P2=TABLE_P1P2):
+    """(stations, factors) of the standard layout of one configuration:
+    sorted default stations, and a (len(GRID_OFFSETS), len(stations)) grid.
+
+    Memoized per (C1C2, P1P2); the returned arrays are read-only.
+    """
+    stations = np.sort(default_stations(C1C2, P1P2))
+    factors = _factors(C1C2, P1P2, GRID_OFFSETS.reshape(-1, 1), stations.reshape(1, -1))
+    stations.setflags(write=False)
+    factors.setflags(write=False)
+    return stations, factors
+
+
+def _grid_positions(grid, values):
+    # index of each value in a sorted grid, and whether it's really there
+    if not len(grid):
+        return np.zeros(len(values), dtype=int), np.zeros(len(values), dtype=bool)
+    i = np.minimum(np.searchsorted(grid, values), len(grid) - 1)
+    return i, grid[i] == values
+
+
+def gradient_factors_at(C1C2, P1P2, lines, stations):
+    """Row-wise factors for paired line names and stations (NaN where unusable).
+
+    C1C2 and P1P2 may be scalars or arrays of the same length.
+    """
+    offsets = pd.Series(lines, dtype=object).map(line_offset).astype(float).to_numpy()
+    stations = pd.to_numeric(pd.Series(stations), errors="coerce").to_numpy(dtype=float)
+    c1c2 = np.broadcast_to(np.asarray(C1C2, dtype=float), stations.shape)
+    p1p2 = np.broadcast_to(np.asarray(P1P2, dtype=float), stations.shape)
+
+    out = np.full(len(stations), np.nan)
+    off_grid = np.ones(len(stations), dtype=bool)
+    configs = pd.DataFrame({"C1C2": c1c2, "P1P2": p1p2}).groupby(["C1C2", "P1P2"]).indices
+    for (c, p), rows in configs.items():
+        if c <= 0 or p <= 0:
+            continue
+        grid_stations, grid = gradient_grid(float(c), float(p))
+        i, on_row = _grid_positions(GRID_OFFSETS, offsets[rows])
+        j, on_col = _grid_positions(grid_stations, stations[rows])
+        hit = on_row & on_col
+        out[rows[hit]] = grid[i[hit], j[hit]]
+        off_grid[rows[hit]] = False
+    if off_grid.any():
+        out[off_grid] = _factors(c1c2[off_grid], p1p2[off_grid], offsets[off_grid], stations[off_grid])
+    return out
+
+
+def gradient_factor(C1C2, P1P2, line, station):
+    """Factor for one reading, or None if the line name or station is unusable."""
+    if C1C2 is None or P1P2 is None or line_offset(line) is None or station is None:
+        return None
+    k = gradient_factors_at(C1C2, P1P2, [line], [station])[0]
+    return None if np.isnan(k) else float(k)
+
+
+def compare_with_table(table, C1C2, P1P2=TABLE_P1P2):
+    """Relative difference (table / computed - 1) for every row of a geom table."""
+    offsets = table["Line"].map(line_offset).astype(float).to_numpy()
+    stations = table["Station"].astype(float).to_numpy()
+    computed = _factors(C1C2, P1P2, offsets, stations)
+    return pd.Series(table["GeometricFactor"].to_numpy(dtype=float) / computed - 1,
+                     index=table.index)
+
+
+if __name__ == "__main__":
+    from geom_tables import GeomRegistry
+
+    registry = GeomRegistry(".")
+    for c1c2 in registry.spreads():
+        diff = compare_with_table(registry.table(c1c2), c1c2).abs().dropna()
+        print(f"C1C2={c1c2}: {len(diff)} rows, median |diff| {diff.median():.2%}, "
+              f"max |diff| {diff.max():.2%}")
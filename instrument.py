@@ -0,0 +1,202 @@
+"""Timing and memory instrumentation of the hot paths.
+
+The slow stages (table loading, factor lookups, building DataFrames,
+drawing plots, writing the export) are wrapped in stage(name). Each one
+records its time, and with memory=True the change in the process RSS, in
+two places:
+
+- the run in progress, if any: begin_run/end_run (or run(...)) bracket one
+  rerun of the app or of a fragment and collect its stages, for the
+  diagnostics panel and one structured log record per rerun;
+- STATS, shared by every session of the process, which keeps the recent
+  samples of each stage for percentiles.
+
+Logs go to the "resistivity.perf" logger as one JSON object per line;
+set RESISTIVITY_PERF_LOG to a file (or "-" for stderr) to write them.
+"""
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+SAMPLES = 2000  # recent samples kept per stage
+PERCENTILES = [50, 90, 99]
+
+log = logging.getLogger("resistivity.perf")
+
+_page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes():
+    """Resident set size of this process, or None where /proc isn't there."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _page_size
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class Stats:
+    """Recent samples per stage, shared across sessions (thread-safe)."""
+
+    def __init__(self, samples=SAMPLES):
+        self.samples = samples
+        self._seconds = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            window = self._seconds.get(name)
+            if window is None:
+                window = self._seconds[name] = deque(maxlen=self.samples)
+            window.append(seconds)
+            self._counts[name] = self._counts.get(name, 0) + 1
+
+    def summary(self, percentiles=PERCENTILES):
+        """{stage: {"count", "p50_ms", ...}} over the samples kept."""
+        with self._lock:
+            windows = {name: np.array(window) for name, window in self._seconds.items()}
+            counts = dict(self._counts)
+        out = {}
+        for name, seconds in sorted(windows.items()):
+            values = np.percentile(seconds, percentiles) * 1e3
+            out[name] = {"count": counts[name],
+                         **{f"p{p}_ms": round(float(v), 3) for p, v in zip(percentiles, values)}}
+        return out
+
+    def clear(self):
+        with self._lock:
+            self._seconds.clear()
+            self._counts.clear()
+
+
+STATS = Stats()
+
+
+class Run:
+    """The stages of one rerun, summed per stage name."""
+
+    def __init__(self, kind, session=None):
+        self.kind = kind
+        self.session = session
+        self.started = time.perf_counter()
+        self.rss_start = rss_bytes()
+        self.seconds = None
+        self.stages = {}  # name -> {"calls", "seconds", "rss_delta"}
+
+    def add(self, name, seconds, rss_delta=None):
+        entry = self.stages.get(name)
+        if entry is None:
+            entry = self.stages[name] = {"calls": 0, "seconds": 0.0, "rss_delta": None}
+        entry["calls"] += 1
+        entry["seconds"] += seconds
+        if rss_delta is not None:
+            entry["rss_delta"] = (entry["rss_delta"] or 0) + rss_delta
+
+    def record(self):
+        """JSON-able summary of the run."""
+        rss = rss_bytes()
+        return {
+            "event": "rerun",
+            "time": round(time.time(), 3),
+            "kind": self.kind,
+            "session": self.session,
+            "ms": round((self.seconds if self.seconds is not None else time.perf_counter() - self.started) * 1e3, 3),
+            "rss_mb": None if rss is None else round(rss / 2**20, 1),
+            "rss_delta_kb": None if rss is None or self.rss_start is None else (rss - self.rss_start) // 1024,
+            "stages": {name: {"calls": e["calls"], "ms": round(e["seconds"] * 1e3, 3),
+                              "rss_delta_kb": None if e["rss_delta"] is None else e["rss_delta"] // 1024}
+                       for name, e in self.stages.items()},
+        }
+
+
+_current = contextvars.ContextVar("resistivity_run", default=None)
+
+
+class stage:
+    """Context manager timing one stage: with stage("plot_render"): ..."""
+
+    __slots__ = ("name", "memory", "_start", "_rss")
+
+    def __init__(self, name, memory=False):
+        self.name = name
+        self.memory = memory
+
+    def __enter__(self):
+        self._rss = rss_bytes() if self.memory else None
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self._start
+        rss_delta = None
+        if self._rss is not None:
+            rss = rss_bytes()
+            rss_delta = None if rss is None else rss - self._rss
+        STATS.add(self.name, seconds)
+        run = _current.get()
+        if run is not None:
+            run.add(self.name, seconds, rss_delta)
+        return False
+
+
+def begin_run(kind, session=None):
+    """Start collecting the stages of a rerun in this thread; a run left
+    unfinished by an earlier rerun (one that raised) is dropped."""
+    current = Run(kind, session)
+    _current.set(current)
+    return current
+
+
+def end_run(current):
+    """Finish a run: log it and add its total to STATS (once)."""
+    if current.seconds is not None:
+        return
+    current.seconds = time.perf_counter() - current.started
+    if _current.get() is current:
+        _current.set(None)
+    STATS.add(f"rerun.{current.kind}", current.seconds)
+    if log.isEnabledFor(logging.INFO):
+        log.info(json.dumps(current.record()))
+
+
+class run:
+    """begin_run/end_run as a context manager. Inside a run that is still
+    going (a fragment called during a full rerun) it adds to that run
+    instead of starting its own."""
+
+    def __init__(self, kind, session=None):
+        self.kind = kind
+        self.session = session
+        self._run = None
+
+    def __enter__(self):
+        outer = _current.get()
+        if outer is not None and outer.seconds is None:
+            return outer
+        self._run = begin_run(self.kind, self.session)
+        return self._run
+
+    def __exit__(self, *exc):
+        if self._run is not None:
+            end_run(self._run)
+        return False
+
+
+def configure_logging(target=None):
+    """Send the perf log to target (a path, or "-" for stderr); defaults to
+    RESISTIVITY_PERF_LOG. Does nothing when neither is set."""
+    target = target or os.environ.get("RESISTIVITY_PERF_LOG")
+    if not target or log.handlers:
+        return
+    handler = logging.StreamHandler() if target == "-" else logging.FileHandler(target, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(handler)
+    log.setLevel(logging.INFO)
+    log.propagate = False
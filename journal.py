@@ -0,0 +1,120 @@
+"""Local write-ahead journal for readings on their way to the survey store.
+
+Once a Record click reaches the server, the reading is appended to
+journal/active.jsonl (fsync'd) before anything else, so it survives a crash
+or restart of the server and an unreachable store. (A click lost on its way
+from the tablet never gets here; the journal is on the server.) replay moves
+the active file aside as a numbered segment and feeds the segments to the
+store in batches, deleting each one once all of it is stored. due() tells
+when enough has queued up, or waited long enough, for a replay to be worth a
+store transaction. Entries carry a uid that the store ignores when it has seen it
+already, so a segment that was half stored before a failure is simply
+replayed again.
+"""
+import json
+import os
+import threading
+import time
+
+JOURNAL_DIR = os.environ.get("RESISTIVITY_JOURNAL", "journal")
+REPLAY_BATCH = 1000  # entries per store transaction
+REPLAY_MIN_ENTRIES = 50  # due() once this many are queued ...
+REPLAY_MAX_AGE = 10.0    # ... or the oldest has waited this many seconds
+
+ACTIVE = "active.jsonl"
+
+
+class Journal:
+    """Append-only queue of journal entries (dicts) in a folder."""
+
+    def __init__(self, folder=JOURNAL_DIR):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self._append_lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        self._depth = sum(self._count(path) for path in self._segments() + [self._active()])
+        # monotonic time the oldest queued entry came in; left from a
+        # previous run counts as long due
+        self._oldest = float("-inf") if self._depth else None
+
+    def _active(self):
+        return os.path.join(self.folder, ACTIVE)
+
+    def _segments(self):
+        names = sorted(n for n in os.listdir(self.folder) if n.endswith(".segment.jsonl"))
+        return [os.path.join(self.folder, n) for n in names]
+
+    @staticmethod
+    def _count(path):
+        if not os.path.exists(path):
+            return 0
+        with open(path, "rb") as f:
+            return sum(1 for line in f if line.strip())
+
+    @staticmethod
+    def _read(path):
+        entries = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    pass  # a line cut short by a crash mid-append was never acknowledged
+        return entries
+
+    def depth(self):
+        """Entries written but not stored yet."""
+        return self._depth
+
+    def due(self, min_entries=REPLAY_MIN_ENTRIES, max_age=REPLAY_MAX_AGE):
+        """Whether a replay is due: min_entries queued, or the oldest queued
+        entry is max_age seconds old."""
+        oldest = self._oldest
+        return oldest is not None and (self._depth >= min_entries or time.monotonic() - oldest >= max_age)
+
+    def append(self, entries):
+        """Write entries durably; returns once they are on disk."""
+        if not entries:
+            return
+        data = "".join(json.dumps(e, default=str) + "\n" for e in entries).encode("utf-8")
+        with self._append_lock:
+            with open(self._active(), "ab") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            if not self._depth:
+                self._oldest = time.monotonic()
+            self._depth += len(entries)
+
+    def replay(self, apply, batch=REPLAY_BATCH):
+        """Feed queued entries to apply(entries) -> (applied, conflicts) in
+        batches, oldest first.
+
+        Returns the combined (applied, conflicts) of what was stored. If apply
+        raises, the failing segment and everything after it stay queued and
+        the exception propagates. A replay already running in another thread
+        makes this a no-op.
+        """
+        applied, conflicts = [], []
+        if not self._replay_lock.acquire(blocking=False):
+            return applied, conflicts
+        try:
+            with self._append_lock:
+                if os.path.exists(self._active()) and os.path.getsize(self._active()):
+                    segment = os.path.join(self.folder, f"{time.time_ns():020d}.segment.jsonl")
+                    os.replace(self._active(), segment)
+            for segment in self._segments():
+                queued = self._count(segment)
+                entries = self._read(segment)
+                for start in range(0, len(entries), batch):
+                    done, skipped = apply(entries[start:start + batch])
+                    applied += done
+                    conflicts += skipped
+                os.remove(segment)
+                with self._append_lock:
+                    self._depth = max(0, self._depth - queued)
+                    if not self._depth:
+                        self._oldest = None
+        finally:
+            self._replay_lock.release()
+        return applied, conflicts
@@ -0,0 +1,325 @@
+"""Load test: many simulated crews driving the real app at once.
+
+    python loadtest.py --sessions 20 --stations 30 --ves 3 --readings 15
+    python loadtest.py --sessions 8 --mode process --out load.json
+
+Each session runs app_.py headlessly through Streamlit's AppTest, in its
+own survey (?survey=load-<n>): it records --stations profiling readings on
+one line, --ves soundings of --readings AB/2 steps each, and exports the
+workbook. Every rerun is timed.
+
+--mode thread (default) runs all sessions in this process, sharing the
+cached tables, store connection and plot cache the way one Streamlit server
+does; the RSS per session is then the process growth divided by the
+sessions. AppTest swaps a process-wide runtime in and out around every run,
+so reruns take turns: "latency" is the time a rerun takes, "response" adds
+the wait for the sessions ahead of it, like requests queueing for a
+one-core server. --mode process runs each session in a worker process
+(reruns of different sessions overlap) and reports the RSS of a process
+serving one session.
+
+The survey store and journal go to a temporary folder unless --db and
+--journal are given, so a run never touches the real surveys.db.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP = os.path.join(HERE, "app_.py")
+PERCENTILES = [50, 90, 99]
+
+_run_lock = threading.Lock()  # one AppTest run at a time per process (see above)
+
+AB_2 = [1, 1.5, 2, 2.5, 3, 3.5, 4, 5, 6, 7, 8, 10, 12, 15, 20, 25, 30, 35, 40, 50, 60, 70, 80, 100,
+        120, 150, 160, 180, 200, 250, 300, 350, 400, 500]
+
+
+def _widget(elements, label):
+    for element in elements:
+        if element.label == label:
+            return element
+    raise LookupError(f"no widget labelled {label!r}")
+
+
+class Session:
+    """One simulated crew; .timings holds (action, seconds, seconds
+    including the wait for its turn) per rerun."""
+
+    def __init__(self, number, options):
+        from streamlit.testing.v1 import AppTest
+
+        self.number = number
+        self.options = options
+        self.timings = []
+        self.errors = []
+        self.rng = random.Random(number)
+        self.at = AppTest.from_file(APP, default_timeout=options["timeout"])
+        self.at.query_params["survey"] = f"load-{number}"
+
+    def _run(self, action):
+        if self.options["think"]:
+            time.sleep(self.rng.uniform(0, 2 * self.options["think"]))
+        queued = time.perf_counter()
+        with _run_lock:
+            start = time.perf_counter()
+            self.at.run()
+            done = time.perf_counter()
+        self.timings.append((action, done - start, done - queued))
+        if self.at.exception:
+            self.errors.append(f"{action}: {self.at.exception[0].message}")
+
+    def _resistance(self):
+        return f"{self.rng.uniform(0.05, 40):.4f}"
+
+    def profiling(self, line, stations):
+        at = self.at
+        _widget(at.radio, "Choose mode").set_value("Profiling")
+        self._run("mode")
+        _widget(at.text_input, "Line number").set_value(line)
+        self._run("entry")
+        for station in stations:
+            at.session_state["num_search"]["result"] = station  # what picking it in the searchbox does
+            _widget(at.text_input, "Resistance (ohms)").set_value(self._resistance())
+            self._run("entry")
+            _widget(at.button, "Record Profiling Data").click()
+            self._run("record")
+
+    def sounding(self, ves, readings):
+        at = self.at
+        _widget(at.radio, "Choose mode").set_value("Sounding")
+        self._run("mode")
+        _widget(at.text_input, "VES number").set_value(ves)
+        self._run("entry")
+        for ab2 in AB_2[:readings]:
+            _widget(at.selectbox, "C1C2/2 (AB/2)").set_value(ab2)
+            _widget(at.text_input, "Resistance (ohms)").set_value(self._resistance())
+            self._run("entry")
+            _widget(at.button, "Record Sounding Data").click()
+            self._run("record")
+
+    def export(self):
+        _widget(self.at.button, "Export").click()
+        self._run("export")
+
+    def state_bytes(self):
+        state = self.at.session_state
+        tables = list(state["lines"].values()) + list(state["sounding"].values())
+        return sum(t.nbytes for t in tables)
+
+    def readings(self):
+        state = self.at.session_state
+        return sum(len(t) for t in state["lines"].values()) + sum(len(t) for t in state["sounding"].values())
+
+
+def run_session(number, options):
+    """Drive one session through the whole workload; returns its result dict."""
+    from instrument import rss_bytes
+
+    lines, stations = options["lines"], options["station_labels"]
+    rss_before = rss_bytes()
+    start = time.perf_counter()
+    session = Session(number, options)
+    try:
+        session._run("open")
+        if options["stations"]:
+            session.profiling(lines[number % len(lines)], stations)
+        for v in range(options["ves"]):
+            session.sounding(f"VES{v + 1}", options["readings"])
+        if options["export"]:
+            session.export()
+    except Exception as e:  # a widget missing, a timeout: count it, keep the others going
+        session.errors.append(f"{type(e).__name__}: {e}")
+    rss_after = rss_bytes()
+    return {
+        "session": number,
+        "seconds": time.perf_counter() - start,
+        "reruns": len(session.timings),
+        "timings": session.timings,
+        "errors": session.errors,
+        "readings": session.readings() if not session.errors else None,
+        "state_bytes": session.state_bytes() if not session.errors else None,
+        "rss_before": rss_before,
+        "rss_after": rss_after,
+        "pid": os.getpid(),
+    }
+
+
+def _init_process(env, own_journal=False):
+    os.environ.update(env)
+    if own_journal:
+        # A worker stands for a separate app instance, and the journal is
+        # local to one (its replay isn't coordinated across processes)
+        os.environ["RESISTIVITY_JOURNAL"] = os.path.join(env["RESISTIVITY_JOURNAL"], str(os.getpid()))
+    os.chdir(HERE)
+
+
+def distribution(values, unit):
+    """Percentiles, max and mean of values, keys suffixed with the unit."""
+    if not values:
+        return {}
+    found = np.percentile(values, PERCENTILES)
+    return {**{f"p{p}_{unit}": round(float(v), 2) for p, v in zip(PERCENTILES, found)},
+            f"max_{unit}": round(max(values), 2), f"mean_{unit}": round(statistics.fmean(values), 2),
+            "count": len(values)}
+
+
+def latency(seconds):
+    return distribution([s * 1e3 for s in seconds], "ms")
+
+
+class RSSMonitor(threading.Thread):
+    """Samples this process's RSS until stopped; keeps the peak."""
+
+    def __init__(self, interval=0.2):
+        super().__init__(daemon=True)
+        from instrument import rss_bytes
+
+        self.rss_bytes = rss_bytes
+        self.interval = interval
+        self.peak = rss_bytes() or 0
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, self.rss_bytes() or 0)
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+def report(results, mode, wall, rss, app_stats):
+    timings = [t for r in results for t in r["timings"]]
+    by_action = {}
+    for action, seconds, _ in timings:
+        by_action.setdefault(action, []).append(seconds)
+    done = [r for r in results if not r["errors"]]
+    out = {
+        "mode": mode,
+        "sessions": len(results),
+        "failed_sessions": len(results) - len(done),
+        "errors": [f"session {r['session']}: {e}" for r in results for e in r["errors"]][:20],
+        "wall_seconds": round(wall, 2),
+        "reruns": len(timings),
+        "throughput_reruns_per_s": round(len(timings) / wall, 2) if wall else None,
+        "latency": latency([s for _, s, _ in timings]),
+        "response": latency([s for _, _, s in timings]),
+        "latency_by_action": {a: latency(s) for a, s in sorted(by_action.items())},
+        "readings_per_session": statistics.fmean(r["readings"] for r in done) if done else None,
+        "state_bytes_per_session": statistics.fmean(r["state_bytes"] for r in done) if done else None,
+        **rss,
+    }
+    if app_stats:
+        out["app_stages"] = app_stats
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive N simulated sessions through app_.py and time them.")
+    parser.add_argument("-n", "--sessions", type=int, default=8, help="simulated sessions (default: 8)")
+    parser.add_argument("-c", "--concurrency", type=int,
+                        help="sessions running at once (default: all of them)")
+    parser.add_argument("--mode", choices=["thread", "process"], default="thread",
+                        help="sessions in one process like a server (default), or one process each")
+    parser.add_argument("--stations", type=int, default=20, help="profiling readings per session (default: 20)")
+    parser.add_argument("--ves", type=int, default=2, help="soundings per session (default: 2)")
+    parser.add_argument("--readings", type=int, default=15,
+                        help=f"AB/2 steps per sounding, up to {len(AB_2)} (default: 15)")
+    parser.add_argument("--no-export", dest="export", action="store_false", help="skip the export")
+    parser.add_argument("--think", type=float, default=0.0,
+                        help="mean pause before each action in seconds (default: 0, back to back)")
+    parser.add_argument("--ramp", type=float, default=0.0, help="seconds over which sessions start")
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false",
+                        help="don't run one session before measuring (thread mode)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-rerun timeout in seconds")
+    parser.add_argument("--db", help="survey store to use (default: a temporary one)")
+    parser.add_argument("--journal", help="journal folder to use (default: a temporary one)")
+    parser.add_argument("-o", "--out", help="write the report as JSON here too")
+    args = parser.parse_args(argv)
+
+    scratch = tempfile.mkdtemp(prefix="resistivity_load_")
+    env = {"RESISTIVITY_DB": args.db or os.path.join(scratch, "surveys.db"),
+           "RESISTIVITY_JOURNAL": args.journal or os.path.join(scratch, "journal")}
+    _init_process(env)  # before any app module reads them
+    from geom_tables import GeomRegistry
+    from instrument import STATS, rss_bytes
+
+    # Real lines and stations of the 400 m spread, so readings get factors
+    tables = GeomRegistry(".")
+    options = {"stations": args.stations, "ves": args.ves, "readings": min(args.readings, len(AB_2)),
+               "export": args.export, "think": args.think, "timeout": args.timeout,
+               "lines": list(dict.fromkeys(tables.table(400)["Line"].astype(str))),
+               "station_labels": tables.stations(400)[:args.stations]}
+    concurrency = max(1, min(args.concurrency or args.sessions, args.sessions))
+
+    def submit(pool, number):
+        if args.ramp and args.sessions > 1:
+            time.sleep(args.ramp / (args.sessions - 1) if number else 0)
+        return pool.submit(run_session, number, options)
+
+    print(f"{args.sessions} session(s), {concurrency} at a time, {args.mode} mode; store in {env['RESISTIVITY_DB']}",
+          file=sys.stderr)
+    if args.mode == "thread" and args.warmup:
+        # First charts, first export, table loading: one-off costs that
+        # would otherwise be charged to the sessions
+        run_session(args.sessions, options)
+        STATS.clear()
+    rss_start = rss_bytes() or 0
+    monitor = RSSMonitor()
+    monitor.start()
+    start = time.perf_counter()
+    results = []
+    if args.mode == "thread":
+        pool = ThreadPoolExecutor(max_workers=concurrency)
+    else:
+        pool = ProcessPoolExecutor(max_workers=concurrency, initializer=_init_process,
+                                   initargs=(env, True))
+    with pool:
+        futures = [submit(pool, n) for n in range(args.sessions)]
+        for future in as_completed(futures):
+            r = future.result()
+            results.append(r)
+            status = f"{len(r['errors'])} error(s)" if r["errors"] else "ok"
+            print(f"  session {r['session']}: {r['reruns']} reruns in {r['seconds']:.1f}s, {status}", file=sys.stderr)
+    wall = time.perf_counter() - start
+    monitor.stop()
+    rss_end = rss_bytes() or 0
+
+    mb = 2 ** 20
+    if args.mode == "thread":
+        rss = {"rss_start_mb": round(rss_start / mb, 1), "rss_end_mb": round(rss_end / mb, 1),
+               "rss_peak_mb": round(monitor.peak / mb, 1),
+               "rss_per_session_mb": round((rss_end - rss_start) / mb / args.sessions, 2)}
+        app_stats = STATS.summary()
+    else:
+        # RSS of a worker after its session, next to that of a fresh one
+        # (interpreter and numpy only, before Streamlit and the app load)
+        measured = [r for r in results if r["rss_after"] and r["rss_before"]]
+        rss = {"rss_session_process": distribution([r["rss_after"] / mb for r in measured], "mb"),
+               "rss_fresh_worker_mb": round(min(r["rss_before"] for r in measured) / mb, 1) if measured else None,
+               "worker_processes": len({r["pid"] for r in results})}
+        app_stats = None
+    out = report(sorted(results, key=lambda r: r["session"]), args.mode, wall, rss, app_stats)
+
+    text = json.dumps(out, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+    print(text)
+    shutil.rmtree(scratch, ignore_errors=True)
+    return 1 if out["failed_sessions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+"""Profile and sounding charts, rendered to PNG and cached.
+
+Charts are keyed by a hash of the plotted arrays plus the chart kind and
+title, so a rerun that doesn't change the data (typing a remark, switching
+tabs) gets the PNG back from the cache instead of drawing it again. Figures
+are built with matplotlib.figure.Figure rather than pyplot, so nothing is
+left in pyplot's global figure list. matplotlib itself is only imported
+when the first figure is drawn; a cache hit never needs it.
+
+render_many renders a batch of charts (an export) over a process pool, since
+Agg rendering holds the GIL and doesn't overlap in threads.
+"""
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from instrument import stage
+
+SOUNDING_STYLE = dict(linestyle='-', linewidth=1.0, color='darkblue', marker="o", markersize=4,
+                      markerfacecolor='red', markeredgecolor='red')
+
+FIT_STYLE = dict(linestyle='--', linewidth=1.2, color='darkorange')
+
+SOUNDING_AXES = {
+    "Schlumberger": ("<----- C1C2/2 (AB/2) ----->", "Schlumberger-Sounding Curve"),
+    "Wenner": ("<----- a ----->", "Wenner-Sounding Curve"),
+    "Dipole-Dipole": (" <----- n x a ----->", "Dipole-Dipole Sounding Curve"),
+}
+
+
+class PlotCache:
+    """LRU of rendered PNG (or other) bytes, bounded by their total size."""
+
+    def __init__(self, budget_bytes=32 * 1024 * 1024):
+        self.budget_bytes = budget_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        with self._lock:
+            png = self._items.get(key)
+            if png is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return png
+
+    def put(self, key, png):
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.nbytes -= len(old)
+            self._items[key] = png
+            self.nbytes += len(png)
+            while self.nbytes > self.budget_bytes and len(self._items) > 1:
+                _, dropped = self._items.popitem(last=False)
+                self.nbytes -= len(dropped)
+
+    def get_or_render(self, key, render):
+        png = self.get(key)
+        if png is None:
+            png = render()
+            self.put(key, png)
+        return png
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
+
+
+PLOT_CACHE = PlotCache()
+
+
+def fingerprint(*arrays):
+    h = hashlib.blake2b(digest_size=16)
+    for a in arrays:
+        a = np.ascontiguousarray(np.asarray(a, dtype=float))
+        h.update(str(a.shape).encode())
+        h.update(a.tobytes())
+    return h.hexdigest()
+
+
+def figure_png(fig):
+    """PNG bytes of a figure; the figure is cleared afterwards."""
+    buf = io.BytesIO()
+    try:
+        fig.savefig(buf, format="png", bbox_inches="tight")
+    finally:
+        fig.clear()
+    return buf.getvalue()
+
+
+def profile_figure(stations, resistivity, title):
+    from matplotlib.figure import Figure
+
+    fig = Figure()
+    ax = fig.subplots()
+    ax.plot(stations, resistivity, marker="o")
+    ax.set_xlabel("Station")
+    ax.set_ylabel("Resistivity")
+    ax.set_title(title)
+    ax.grid(True)
+    return fig
+
+
+def sounding_x(method, df):
+    """Spacing plotted on the x axis for a method: AB/2, a or n x a."""
+    if method == "Schlumberger":
+        return df["C1C2/2"]
+    if method == "Wenner":
+        return df["a"]
+    return df["a"] * df["n"]
+
+
+def sounding_figure(method, spacing, resistivity, fit=None):
+    """fit: optional (spacing, apparent resistivity) of a model curve, drawn
+    over the readings."""
+    from matplotlib.figure import Figure
+
+    fig = Figure()
+    ax = fig.subplots()
+    ax.loglog(spacing, resistivity, **SOUNDING_STYLE)
+    if fit is not None:
+        ax.loglog(*fit, **FIT_STYLE, label="Layered-earth fit")
+        ax.legend()
+    xlabel, title = SOUNDING_AXES[method]
+    ax.set_xlabel(xlabel)
+    ax.set_title(title)
+    ax.set_ylabel("<----- Resistivity ----->")
+    ax.set_xscale('log')
+    ax.set_yscale('log')
+    ax.minorticks_on()
+    ax.grid(True, which="both", linestyle="--", linewidth=0.4)
+    return fig
+
+
+def profile_job(stations, resistivity, title):
+    """A picklable chart spec for render_chart/render_many."""
+    return ("profile", np.asarray(stations, dtype=float), np.asarray(resistivity, dtype=float), title)
+
+
+def sounding_job(method, df, fit=None):
+    if fit is not None:
+        fit = tuple(np.asarray(a, dtype=float) for a in fit)
+    return ("sounding", method, np.asarray(sounding_x(method, df), dtype=float),
+            np.asarray(df["resistivity"], dtype=float), fit)
+
+
+def job_key(job):
+    if job[0] == "profile":
+        _, stations, resistivity, title = job
+        return ("profile", title, fingerprint(stations, resistivity))
+    _, method, spacing, resistivity, fit = job
+    return ("sounding", method, fingerprint(spacing, resistivity, *(fit or ())))
+
+
+def render_chart(job):
+    """Draw one chart spec to PNG bytes (runs in the worker processes too)."""
+    with stage("plot_render", memory=True):
+        if job[0] == "profile":
+            return figure_png(profile_figure(*job[1:]))
+        return figure_png(sounding_figure(*job[1:]))
+
+
+def profile_png(stations, resistivity, title, cache=PLOT_CACHE):
+    job = profile_job(stations, resistivity, title)
+    return cache.get_or_render(job_key(job), lambda: render_chart(job))
+
+
+def sounding_png(method, df, fit=None, cache=PLOT_CACHE):
+    job = sounding_job(method, df, fit)
+    return cache.get_or_render(job_key(job), lambda: render_chart(job))
+
+
+# --- Batch rendering over a process pool ---
+PARALLEL_MIN_JOBS = 3  # below this the pool round trip isn't worth it
+WORKERS = min(4, os.cpu_count() or 1)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the Streamlit server process is multi-threaded
+            _pool = ProcessPoolExecutor(max_workers=WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def render_many(jobs, progress=None, cache=PLOT_CACHE):
+    """PNG bytes for every job, in the order given.
+
+    Cached charts are reused; the rest are rendered in parallel worker
+    processes (inline for small batches). progress(done, total) is called
+    from this thread as charts complete.
+    """
+    total = len(jobs)
+    keys = [job_key(job) for job in jobs]
+    pngs = [cache.get(key) for key in keys]
+    todo = [i for i, png in enumerate(pngs) if png is None]
+    done = total - len(todo)
+    if progress:
+        progress(done, total)
+
+    def finish(i, png):
+        nonlocal done
+        pngs[i] = png
+        cache.put(keys[i], png)
+        done += 1
+        if progress:
+            progress(done, total)
+
+    if WORKERS > 1 and len(todo) >= PARALLEL_MIN_JOBS:
+        try:
+            pool = _get_pool()
+            futures = {pool.submit(render_chart, jobs[i]): i for i in todo}
+            for future in as_completed(futures):
+                finish(futures[future], future.result())
+            return pngs
+        except BrokenProcessPool:
+            # a worker died (e.g. killed for memory); finish what's left here
+            _reset_pool()
+            todo = [i for i in todo if pngs[i] is None]
+
+    for i in todo:
+        finish(i, render_chart(jobs[i]))
+    return pngs
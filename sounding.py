@@ -0,0 +1,79 @@
+"""Geometric factors and apparent resistivity for sounding (VES) arrays.
+
+Everything here works on whole arrays of readings at once. Zero, negative or
+missing spacings give NaN instead of raising, so a bad row in a field book
+doesn't stop the rest from being processed. sounding_values is the one
+entry point for readings: the Record button (sounding_reading), field book
+imports and the CLI all get their factors and resistivities from it.
+
+    Schlumberger   K = pi * ((AB/2)^2 - (MN/2)^2) / (2 * MN/2)
+    Wenner         K = 2 * pi * a
+    Dipole-Dipole  K = pi * n * (n + 1) * (n + 2) * a
+"""
+import numpy as np
+import pandas as pd
+
+METHODS = ["Schlumberger", "Wenner", "Dipole-Dipole"]
+
+# The field sheets (and every factor recorded so far) use 3.1428 for pi
+PI = 3.1428
+
+def _spacing(values):
+    if values is None:
+        return np.array([np.nan])
+    values = pd.to_numeric(pd.Series(np.atleast_1d(values)), errors="coerce").to_numpy(dtype=float)
+    return np.where(values > 0, values, np.nan)
+
+
+def sounding_factors(method, ab2=None, mn2=None, a=None, n=None):
+    """Geometric factors for arrays of AB/2 and MN/2 (Schlumberger), a (Wenner)
+    or n and a (Dipole-Dipole). Invalid geometry gives NaN."""
+    if method == "Schlumberger":
+        ab2, mn2 = _spacing(ab2), _spacing(mn2)
+        k = PI * (ab2 ** 2 - mn2 ** 2) / (2 * mn2)
+        return np.where(ab2 > mn2, k, np.nan)
+    if method == "Wenner":
+        return 2 * PI * _spacing(a)
+    if method == "Dipole-Dipole":
+        n, a = _spacing(n), _spacing(a)
+        return PI * n * (n + 1) * (n + 2) * a
+    raise ValueError(f"Unknown sounding method: {method!r}")
+
+
+def apparent_resistivity(resistance, factors):
+    """resistance * K rounded to 6 decimals; NaN where either is missing."""
+    resistance = pd.to_numeric(pd.Series(np.atleast_1d(resistance)), errors="coerce").to_numpy(dtype=float)
+    factors = pd.to_numeric(pd.Series(np.atleast_1d(factors)), errors="coerce").to_numpy(dtype=float)
+    return np.round(resistance * factors, 6)
+
+
+def sounding_values(method, resistance, ab2=None, mn2=None, a=None, n=None):
+    """(factors, apparent resistivities) for arrays of readings of one
+    method, in one vectorized pass. NaN where the spacings or the
+    resistance can't give a value."""
+    factors = sounding_factors(method, ab2=ab2, mn2=mn2, a=a, n=n)
+    return factors, apparent_resistivity(resistance, factors)
+
+
+def _spacings(method, C1C2_val, P1P2_val):
+    # the two values the app asks for, as sounding_factors arguments
+    if method == "Schlumberger":
+        return {"ab2": C1C2_val, "mn2": P1P2_val}
+    if method == "Wenner":
+        return {"a": P1P2_val}
+    return {"n": C1C2_val, "a": P1P2_val}
+
+
+def sounding_reading(method, C1C2_val, P1P2_val, resistance):
+    """(gfactor, resistivity) of a single reading as entered in the app,
+    either None when it can't be worked out."""
+    k, rho = sounding_values(method, resistance, **_spacings(method, C1C2_val, P1P2_val))
+    k, rho = float(k[0]), float(rho[0])
+    return (None if np.isnan(k) else k), (None if np.isnan(rho) else rho)
+
+
+def sounding_factor(method, C1C2_val, P1P2_val):
+    """Single reading as entered in the app (C1C2_val is AB/2 or n, P1P2_val
+    is MN/2 or a). Returns None when the spacings can't give a factor."""
+    k = float(sounding_factors(method, **_spacings(method, C1C2_val, P1P2_val))[0])
+    return None if np.isnan(k) else k
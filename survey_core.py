@@ -0,0 +1,135 @@
+"""Recording and batch processing of readings, shared by the app and the CLI.
+
+Nothing here touches Streamlit: the app's Record buttons and file imports
+call the same functions the command line (cli.py) runs over whole archives.
+"""
+import os
+
+from field_import import (file_kind, merge_profiling, merge_soundings, read_profiling_file,
+                          read_sounding_file)
+from gradient import TABLE_P1P2, default_stations, gradient_factor
+from instrument import stage
+from sounding import apparent_resistivity, sounding_reading
+from survey_store import line_table, sounding_table
+
+PROFILING_METHOD = "Gradient"
+
+
+def survey_meta(date="", client="", location="", latitude=None, longitude=None,
+                geology="", soiltype="", linedir="", method=""):
+    """The Survey Info block every line and VES carries."""
+    return {
+        "Date": str(date),
+        "Client": client,
+        "Location": location,
+        "Latitude": latitude,
+        "Longitude": longitude,
+        "Geology": geology,
+        "Soil Type/Color": soiltype,
+        "Line direction": linedir,
+        "Method": method,
+    }
+
+
+def profiling_factor(registry, C1C2, line, station, P1P2=None, warn=None):
+    """Factor for one profiling reading, or None when none can be found.
+
+    The shipped tables are for P1P2 = 10. A spread that has a table takes
+    its factors from it, so a line or station it doesn't list comes back
+    None; its blank cells, other spreads and other P1P2 are computed from
+    geometry. warn(msg) is told when a table can't be read (geometry is
+    used then).
+    """
+    with stage("geom_factor"):
+        if (P1P2 is None or P1P2 == TABLE_P1P2) and C1C2 in registry:
+            try:
+                gfactor = registry.lookup(C1C2, line, station)
+                if gfactor is not None or not registry.listed(C1C2, line, station):
+                    return gfactor
+            except Exception as e:
+                if warn is None:
+                    raise
+                warn(f"Could not load geometric factor files: {e}")
+        return gradient_factor(C1C2, P1P2 or TABLE_P1P2, line, station)
+
+
+def profiling_stations(registry, C1C2, P1P2):
+    """Station labels offered for a spread: the table's, or the standard ones."""
+    if P1P2 == TABLE_P1P2 and C1C2 in registry:
+        return registry.stations(C1C2)
+    return [f"{s:g}" for s in default_stations(C1C2, P1P2)]
+
+
+def _resistivity(resistance, gfactor):
+    if resistance is None or gfactor is None:
+        return None
+    return float(apparent_resistivity(resistance, gfactor)[0])
+
+
+def record_profiling(lines, registry, line, station, resistance, remark, meta, C1C2, P1P2, warn=None):
+    """Record (or re-record) one station of a line; returns (gfactor,
+    resistivity), either None when it couldn't be worked out.
+
+    A new line gets meta plus the spread; the reading is stored even
+    without a factor, as entered.
+    """
+    if line not in lines:
+        lines[line] = line_table({**meta, "C1C2": C1C2, "P1P2": P1P2})
+    gfactor = profiling_factor(registry, C1C2, line, station, P1P2, warn)
+    resistivity = _resistivity(resistance, gfactor)
+    lines[line].upsert(station, {
+        "station": station,
+        "resistance": resistance,
+        "gfactor": gfactor,
+        "resistivity": resistivity,
+        "remarks": remark,
+    })
+    return gfactor, resistivity
+
+
+def sounding_spacing(method, C1C2_val, P1P2_val):
+    """Recorded spacing columns for the two values the app asks for."""
+    if method == "Schlumberger":
+        return {"C1C2/2": C1C2_val, "P1P2/2": P1P2_val}
+    if method == "Wenner":
+        return {"a": P1P2_val}
+    return {"n": C1C2_val, "a": P1P2_val}
+
+
+def record_sounding(soundings, ves, method, C1C2_val, P1P2_val, resistance, remark, meta):
+    """Record one reading of a VES, keyed by (C1C2_val, P1P2_val); returns
+    (gfactor, resistivity) like record_profiling.
+
+    Raises ValueError when the VES was recorded with another method.
+    """
+    if ves not in soundings:
+        soundings[ves] = sounding_table({"VES": ves, **meta, "Method": method})
+    table = soundings[ves]
+    if table.meta["Method"] != method:
+        raise ValueError(f"{ves} is a {table.meta['Method']} sounding")
+    gfactor, resistivity = sounding_reading(method, C1C2_val, P1P2_val, resistance)
+    table.upsert((C1C2_val, P1P2_val), {
+        **sounding_spacing(method, C1C2_val, P1P2_val),
+        "resistance": resistance,
+        "gfactor": gfactor,
+        "resistivity": resistivity,
+        "remark": remark,
+    })
+    return gfactor, resistivity
+
+
+def process_file(path, registry, C1C2=400.0, P1P2=TABLE_P1P2, method="Schlumberger", meta=None,
+                 kind=None):
+    """Read one field file into (lines, soundings) RecordTables.
+
+    kind is "profiling" or "sounding" (None: guessed from the header). C1C2
+    and P1P2 are used for profiling rows without their own; method for
+    sounding rows without a Method column.
+    """
+    meta = meta or survey_meta()
+    kind = kind or file_kind(path)
+    if kind == "profiling":
+        readings = read_profiling_file(path, registry, C1C2, P1P2)
+        return merge_profiling({}, readings, {**meta, "Method": meta.get("Method") or PROFILING_METHOD}), {}
+    readings = read_sounding_file(path, method, filename=os.path.basename(path))
+    return {}, merge_soundings({}, readings, {**meta, "Method": method})
@@ -0,0 +1,392 @@
+"""SQLite store that keeps recorded readings across refreshes and restarts.
+
+Readings are only ever appended: recording a station again adds a row, and
+the newest row per (survey, line, station) or (survey, VES, spacing) is the
+current one. The database runs in WAL mode, so readers never wait on the
+writer. Each sync writes every changed line and VES of a session in one
+transaction.
+
+The app still works on RecordTables (survey_store); load_survey rebuilds
+them from the database and sync appends whatever changed since the last
+sync.
+
+Several sessions (crews) can record into the same survey at once. Writes
+are optimistic per (line, station) and (VES, spacing): a reading is only
+appended if nobody stored a newer one for that key since this session last
+saw it, otherwise it's reported as a conflict and the other crew's value
+is kept. poll brings in what the other sessions stored since the last look.
+Rejected readings are noted per writer, so a session hears about its own
+conflicts whichever session replayed them (take_conflicts).
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from survey_store import PROFILING_TEXT, SOUNDING_TEXT, line_table, sounding_table
+
+DB_PATH = os.environ.get("RESISTIVITY_DB", "surveys.db")
+
+SOUNDING_VALUES = ["C1C2/2", "P1P2/2", "a", "n"]  # every method's spacing columns
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    survey TEXT NOT NULL,
+    kind TEXT NOT NULL,          -- 'line' or 'ves'
+    name TEXT NOT NULL,
+    meta TEXT NOT NULL,          -- JSON
+    created REAL NOT NULL,
+    PRIMARY KEY (survey, kind, name)
+);
+CREATE TABLE IF NOT EXISTS profiling (
+    id INTEGER PRIMARY KEY,
+    uid TEXT,                    -- id of the journal entry, for idempotent replay
+    writer TEXT,                 -- session that recorded it
+    survey TEXT NOT NULL,
+    line TEXT NOT NULL,
+    station REAL,
+    resistance REAL,
+    gfactor REAL,
+    resistivity REAL,
+    remarks TEXT,
+    recorded REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS profiling_key ON profiling (survey, line, station, id);
+CREATE TABLE IF NOT EXISTS sounding (
+    id INTEGER PRIMARY KEY,
+    uid TEXT,
+    writer TEXT,
+    survey TEXT NOT NULL,
+    ves TEXT NOT NULL,
+    spacing1 REAL,               -- the key the app records under:
+    spacing2 REAL,               -- (AB/2, MN/2), (None, a) or (n, a)
+    ab2 REAL,
+    mn2 REAL,
+    a REAL,
+    n REAL,
+    resistance REAL,
+    gfactor REAL,
+    resistivity REAL,
+    remark TEXT,
+    recorded REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sounding_key ON sounding (survey, ves, spacing1, spacing2, id);
+CREATE TABLE IF NOT EXISTS conflict (
+    uid TEXT PRIMARY KEY,        -- the journal entry that was not stored
+    writer TEXT NOT NULL,
+    survey TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    key TEXT NOT NULL,           -- JSON
+    recorded REAL NOT NULL,
+    reported INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS conflict_writer ON conflict (writer, reported);
+"""
+
+# Columns added after the first release, for databases created before them
+MIGRATIONS = [("profiling", "uid", "TEXT"), ("profiling", "writer", "TEXT"),
+              ("sounding", "uid", "TEXT"), ("sounding", "writer", "TEXT")]
+
+INDEXES = """
+CREATE UNIQUE INDEX IF NOT EXISTS profiling_uid ON profiling (uid);
+CREATE UNIQUE INDEX IF NOT EXISTS sounding_uid ON sounding (uid);
+"""
+
+# Newest row per key, in the order the keys were first recorded
+_LATEST = """
+SELECT t.* FROM (
+    SELECT {key}, MIN(id) AS first, MAX(id) AS last FROM {table}
+    WHERE survey = ? GROUP BY {key}
+) k JOIN {table} t ON t.id = k.last
+ORDER BY k.first
+"""
+_PROFILING_KEY = dict(table="profiling", key="line, station")
+_SOUNDING_KEY = dict(table="sounding", key="ves, spacing1, spacing2")
+
+# Append a reading unless another session stored a newer one for the same
+# key than this one has seen (id > ?). An entry already applied (same uid)
+# is ignored, so replaying a journal twice is harmless.
+_INSERT_PROFILING = """
+INSERT OR IGNORE INTO profiling (uid, writer, survey, line, station, resistance, gfactor,
+                                 resistivity, remarks, recorded)
+SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+WHERE NOT EXISTS (SELECT 1 FROM profiling WHERE survey = ? AND line = ? AND station IS ?
+                  AND id > ? AND writer IS NOT ?)
+"""
+_INSERT_SOUNDING = """
+INSERT OR IGNORE INTO sounding (uid, writer, survey, ves, spacing1, spacing2, ab2, mn2, a, n,
+                                resistance, gfactor, resistivity, remark, recorded)
+SELECT ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?
+WHERE NOT EXISTS (SELECT 1 FROM sounding WHERE survey = ? AND ves = ? AND spacing1 IS ?
+                  AND spacing2 IS ? AND id > ? AND writer IS NOT ?)
+"""
+
+
+def _value(v):
+    # numpy scalars and NaN -> plain Python / NULL
+    if v is None:
+        return None
+    if isinstance(v, (float, np.floating)):
+        return None if np.isnan(v) else float(v)
+    return v
+
+
+def _key(v):
+    return None if v is None or pd.isna(v) else float(v)
+
+
+class SyncState:
+    """What one session has stored and seen of a survey."""
+
+    def __init__(self):
+        self.writer = uuid.uuid4().hex
+        self.versions = {}  # (kind, name) -> table version already stored
+        self.seen = {}      # (kind, name) -> {key: id of the newest stored row}
+        self.cursor = {"profiling": 0, "sounding": 0}  # newest row ids looked at
+
+    def seen_id(self, kind, name, key):
+        return self.seen.get((kind, name), {}).get(key, 0)
+
+    def stored(self, applied):
+        """Note the rows of an apply() result that came from this session."""
+        for entry, row_id in applied:
+            if entry["writer"] == self.writer:
+                seen = self.seen.setdefault((entry["kind"], entry["name"]), {})
+                key = _entry_key(entry)
+                seen[key] = max(seen.get(key, 0), row_id)
+
+
+def _entry_key(entry):
+    key = entry["key"]
+    return tuple(key) if entry["kind"] == "ves" else key
+
+
+class SurveyDB:
+    """Readings of every survey in one SQLite file (one connection per thread)."""
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+            for table, column, kind in MIGRATIONS:
+                columns = [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {kind}")
+            conn.executescript(INDEXES)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")  # every commit survives a power cut
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def surveys(self):
+        rows = self._conn().execute(
+            "SELECT survey FROM series GROUP BY survey ORDER BY MAX(created) DESC").fetchall()
+        return [r[0] for r in rows]
+
+    # --- writes ---
+    def pending(self, survey, lines: dict, soundings: dict, state: SyncState):
+        """Journal entries (plain dicts) for the rows changed since the last
+        call, which counts them as saved.
+
+        An entry carries everything apply needs: the reading, the meta of
+        its line or VES and the id of the newest row the session had seen
+        for its key.
+        """
+        now = time.time()
+        entries = []
+        for kind, tables in (("line", lines), ("ves", soundings)):
+            for name, table in tables.items():
+                done = state.versions.get((kind, name))
+                if done == table.version:
+                    continue
+                keys, df = table.changed_since(done or 0)
+                state.versions[(kind, name)] = table.version
+                text = PROFILING_TEXT if kind == "line" else SOUNDING_TEXT
+                columns = (table.columns if kind == "line" else
+                           SOUNDING_VALUES + ["resistance", "gfactor", "resistivity"])
+                values = {c: df[c].to_numpy() if c in df else np.full(len(df), np.nan) for c in columns}
+                texts = df[text].astype(str).tolist()
+                for i, k in enumerate(keys):
+                    k = _key(k) if kind == "line" else [_key(k[0]), _key(k[1])]
+                    entries.append({
+                        "uid": uuid.uuid4().hex, "writer": state.writer, "survey": survey,
+                        "kind": kind, "name": name, "key": k,
+                        "base": state.seen_id(kind, name, k if kind == "line" else tuple(k)),
+                        "values": {**{c: _value(values[c][i]) for c in columns}, text: texts[i]},
+                        "recorded": now,
+                    })
+                if keys:
+                    entries[-len(keys)]["meta"] = table.meta  # once per line/VES
+        return entries
+
+    def apply(self, entries):
+        """Store journal entries in one transaction.
+
+        Returns (applied, conflicts): applied pairs each stored entry with its
+        row id (entries stored by an earlier replay included), conflicts
+        lists the entries skipped because another session stored a newer
+        reading for their key. The skipped ones are also noted for their
+        writer (take_conflicts).
+        """
+        applied, conflicts = [], []
+        with self._conn() as conn:  # commits, or rolls back on error
+            # a line or VES keeps its first created time; its meta is the latest saved
+            conn.executemany("INSERT INTO series VALUES (?, ?, ?, ?, ?) ON CONFLICT (survey, kind, name) "
+                             "DO UPDATE SET meta = excluded.meta", [
+                (e["survey"], e["kind"], e["name"], json.dumps(e["meta"], default=str), e["recorded"])
+                for e in entries if "meta" in e])
+            for e in entries:
+                v = e["values"]
+                head = (e["uid"], e["writer"], e["survey"], e["name"])
+                check = (e["base"], e["writer"])
+                if e["kind"] == "line":
+                    table = "profiling"
+                    cur = conn.execute(_INSERT_PROFILING, (
+                        *head, e["key"], v["resistance"], v["gfactor"], v["resistivity"],
+                        v[PROFILING_TEXT], e["recorded"], e["survey"], e["name"], e["key"], *check))
+                else:
+                    table = "sounding"
+                    cur = conn.execute(_INSERT_SOUNDING, (
+                        *head, *e["key"], *(v[c] for c in SOUNDING_VALUES), v["resistance"],
+                        v["gfactor"], v["resistivity"], v[SOUNDING_TEXT], e["recorded"],
+                        e["survey"], e["name"], *e["key"], *check))
+                if cur.rowcount:
+                    applied.append((e, cur.lastrowid))
+                    continue
+                row = conn.execute(f"SELECT id FROM {table} WHERE uid = ?", (e["uid"],)).fetchone()
+                if row:
+                    applied.append((e, row[0]))  # replayed before
+                else:
+                    conflicts.append(e)
+            # noted once per entry: a replay of the same entries adds nothing
+            conn.executemany("INSERT OR IGNORE INTO conflict (uid, writer, survey, kind, name, key, recorded) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?)", [
+                                 (e["uid"], e["writer"], e["survey"], e["kind"], e["name"],
+                                  json.dumps(e["key"]), e["recorded"]) for e in conflicts])
+        return applied, conflicts
+
+    def take_conflicts(self, writer):
+        """Conflicts of a writer's entries not reported yet, oldest first, as
+        dicts (survey, kind, name, key); they count as reported after this."""
+        conn = self._conn()
+        with conn:
+            rows = conn.execute(
+                "SELECT uid, survey, kind, name, key FROM conflict WHERE writer = ? AND reported = 0 "
+                "ORDER BY recorded, rowid", (writer,)).fetchall()
+            conn.executemany("UPDATE conflict SET reported = 1 WHERE uid = ?", [(r[0],) for r in rows])
+        return [{"survey": survey, "kind": kind, "name": name, "key": json.loads(key)}
+                for _, survey, kind, name, key in rows]
+
+    def sync(self, survey, lines: dict, soundings: dict, state: SyncState):
+        """Store the rows changed since the last sync straight away (no
+        journal); returns this session's conflicts (take_conflicts)."""
+        versions = dict(state.versions)
+        try:
+            applied, _ = self.apply(self.pending(survey, lines, soundings, state))
+        except BaseException:
+            state.versions = versions  # nothing was stored; try again next time
+            raise
+        state.stored(applied)
+        return self.take_conflicts(state.writer)
+
+    # --- reads ---
+    def _latest(self, spec, survey):
+        return pd.read_sql_query(_LATEST.format(**spec), self._conn(), params=[survey])
+
+    def _meta(self, survey, kind, names=None):
+        rows = self._conn().execute(
+            "SELECT name, meta FROM series WHERE survey = ? AND kind = ? ORDER BY created, rowid",
+            (survey, kind)).fetchall()
+        return {name: json.loads(meta) for name, meta in rows if names is None or name in names}
+
+    def _merge(self, survey, lines, soundings, state, profiling, sounding):
+        """Upsert stored rows (newest last) into the session's tables; returns
+        how many readings changed."""
+        merged = 0
+        for kind, tables, rows, column in (("line", lines, profiling, "line"),
+                                           ("ves", soundings, sounding, "ves")):
+            if rows.empty:
+                continue
+            rows = rows.rename(columns={"ab2": "C1C2/2", "mn2": "P1P2/2"})
+            new = set(rows[column]) - set(tables)
+            metas = self._meta(survey, kind, new) if new else {}
+            for name, group in rows.groupby(column, sort=False):
+                if kind == "line":
+                    keys = [_key(s) for s in group["station"]]
+                else:
+                    keys = [(_key(k1), _key(k2)) for k1, k2 in zip(group["spacing1"], group["spacing2"])]
+                seen = state.seen.setdefault((kind, name), {})
+                fresh = [i for i, (k, row_id) in enumerate(zip(keys, group["id"])) if row_id > seen.get(k, 0)]
+                if not fresh:
+                    continue
+                table = tables.get(name)
+                if table is None:
+                    table = tables[name] = (line_table if kind == "line" else sounding_table)(metas[name])
+                up_to_date = state.versions.get((kind, name), 0) == table.version
+                group = group.iloc[fresh]
+                keys = [keys[i] for i in fresh]
+                text = PROFILING_TEXT if kind == "line" else SOUNDING_TEXT
+                table.upsert_many(keys, {**{c: group[c] for c in table.columns if c in group},
+                                         text: group[text].fillna("")})
+                for k, row_id in zip(keys, group["id"]):
+                    seen[k] = max(seen.get(k, 0), int(row_id))
+                if up_to_date:
+                    state.versions[(kind, name)] = table.version  # nothing of ours to store
+                merged += len(keys)
+        return merged
+
+    def load_survey(self, survey):
+        """(lines, soundings, SyncState) for a survey, tables as RecordTables."""
+        lines, soundings, state = {}, {}, SyncState()
+        conn = self._conn()
+        with conn:  # one snapshot for the cursors and the rows
+            conn.execute("BEGIN")
+            for table in state.cursor:
+                state.cursor[table] = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+            profiling = self._latest(_PROFILING_KEY, survey)
+            sounding = self._latest(_SOUNDING_KEY, survey)
+            for name, meta in self._meta(survey, "line").items():
+                lines[name] = line_table(meta)
+            for name, meta in self._meta(survey, "ves").items():
+                soundings[name] = sounding_table(meta)
+        state.versions = {("line", name): 0 for name in lines}
+        state.versions.update({("ves", name): 0 for name in soundings})
+        self._merge(survey, lines, soundings, state, profiling, sounding)
+        return lines, soundings, state
+
+    def poll(self, survey, lines: dict, soundings: dict, state: SyncState):
+        """Merge in readings other sessions stored since the last poll.
+
+        Cheap when nothing changed (one MAX(id) per table). Returns how many
+        readings were merged.
+        """
+        conn = self._conn()
+        frames = {}
+        for table in state.cursor:
+            newest = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+            if newest <= state.cursor[table]:
+                frames[table] = pd.DataFrame()
+                continue
+            frames[table] = pd.read_sql_query(
+                f"SELECT * FROM {table} WHERE id > ? AND id <= ? AND survey = ? ORDER BY id",
+                conn, params=[state.cursor[table], newest, survey])
+            state.cursor[table] = newest
+        return self._merge(survey, lines, soundings, state, frames["profiling"], frames["sounding"])
@@ -0,0 +1,207 @@
+"""Column-wise storage for the readings recorded in a session.
+
+Each profiling line and each VES is a RecordTable: its meta dict plus one
+float64 array per numeric column and a categorical remark column, with a
+key -> row map so recording a station again updates it in place. frame()
+hands the arrays to pandas without copying them.
+"""
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from instrument import stage
+
+PROFILING_COLUMNS = ["station", "resistance", "gfactor", "resistivity"]
+PROFILING_TEXT = "remarks"
+
+# Spacing columns each sounding method records (see sounding_table)
+SOUNDING_SPACING = {
+    "Schlumberger": ["C1C2/2", "P1P2/2"],
+    "Wenner": ["a"],
+    "Dipole-Dipole": ["n", "a"],
+}
+SOUNDING_TEXT = "remark"
+
+
+def _float(value):
+    return np.nan if value is None else float(value)
+
+
+class RecordTable:
+    """Rows of float columns plus one text column, keyed for O(1) upserts."""
+
+    def __init__(self, meta, columns, text_column, capacity=32):
+        self.meta = meta
+        self.columns = list(columns)
+        self.text_column = text_column
+        self.version = 0  # bumped on every change
+        self._fingerprint = None  # (version, digest)
+        self._n = 0
+        self._data = {c: np.full(capacity, np.nan) for c in self.columns}
+        self._codes = np.full(capacity, -1, dtype=np.int32)
+        self._stamps = np.zeros(capacity, dtype=np.int64)  # version of each row's last write
+        self._categories = []
+        self._category_code = {}
+        self._row = {}
+
+    def __len__(self):
+        return self._n
+
+    def __contains__(self, key):
+        return key in self._row
+
+    def keys(self):
+        return list(self._row)
+
+    @property
+    def nbytes(self):
+        """Memory held by the arrays (allocated capacity, not just the rows)."""
+        return sum(a.nbytes for a in self._data.values()) + self._codes.nbytes + self._stamps.nbytes
+
+    def _grow(self, needed):
+        capacity = len(self._codes)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for c in self.columns:
+            grown = np.full(capacity, np.nan)
+            grown[:self._n] = self._data[c][:self._n]
+            self._data[c] = grown
+        codes = np.full(capacity, -1, dtype=np.int32)
+        codes[:self._n] = self._codes[:self._n]
+        self._codes = codes
+        stamps = np.zeros(capacity, dtype=np.int64)
+        stamps[:self._n] = self._stamps[:self._n]
+        self._stamps = stamps
+
+    def _code(self, text):
+        text = "" if text is None else str(text)
+        code = self._category_code.get(text)
+        if code is None:
+            code = self._category_code[text] = len(self._categories)
+            self._categories.append(text)
+        return code
+
+    def _rows_for(self, keys):
+        rows = np.empty(len(keys), dtype=np.intp)
+        for i, key in enumerate(keys):
+            row = self._row.get(key)
+            if row is None:
+                row = self._row[key] = self._n
+                self._n += 1
+            rows[i] = row
+        return rows
+
+    def upsert(self, key, values: dict):
+        """Insert or replace the row for key; values maps column -> value."""
+        row = self._row.get(key)
+        if row is None:
+            self._grow(self._n + 1)
+            row = self._row[key] = self._n
+            self._n += 1
+        for c in self.columns:
+            self._data[c][row] = _float(values.get(c))
+        self._codes[row] = self._code(values.get(self.text_column))
+        self.version += 1
+        self._stamps[row] = self.version
+
+    def upsert_many(self, keys, columns: dict):
+        """Vectorized upsert; later duplicates of a key win."""
+        keys = list(keys)
+        if not keys:
+            return
+        self._grow(self._n + len(keys))
+        rows = self._rows_for(keys)
+        # keep only the last occurrence of each row
+        _, last = np.unique(rows[::-1], return_index=True)
+        pick = len(rows) - 1 - last
+        for c in self.columns:
+            values = columns.get(c)
+            if values is None:
+                values = np.full(len(keys), np.nan)
+            elif not (isinstance(values, np.ndarray) and values.dtype == np.float64):
+                values = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=float)
+            self._data[c][rows[pick]] = values[pick]
+        texts = columns.get(self.text_column)
+        texts = [""] * len(keys) if texts is None else list(texts)
+        self._codes[rows[pick]] = [self._code(texts[i]) for i in pick]
+        self.version += 1
+        self._stamps[rows] = self.version
+
+    def get(self, key):
+        """One row as a dict (None for missing numbers), or None."""
+        row = self._row.get(key)
+        if row is None:
+            return None
+        record = {}
+        for c in self.columns:
+            value = self._data[c][row]
+            record[c] = None if np.isnan(value) else float(value)
+        record[self.text_column] = self._categories[self._codes[row]]
+        return record
+
+    def changed_since(self, version):
+        """(keys, frame) of the rows written after version, in row order."""
+        rows = np.flatnonzero(self._stamps[:self._n] > version)
+        keys = list(self._row)  # insertion order is row order
+        return [keys[i] for i in rows], self.frame().iloc[rows]
+
+    def column(self, name):
+        """Read-only view of one numeric column."""
+        view = self._data[name][:self._n]
+        view.flags.writeable = False
+        return view
+
+    def frame(self):
+        """DataFrame over the stored arrays (no copy), in recording order.
+
+        Like any view it reflects later changes to the table; take .copy() to
+        keep a snapshot.
+        """
+        with stage("frame"):
+            data = {c: self.column(c) for c in self.columns}
+            data[self.text_column] = pd.Categorical.from_codes(
+                self._codes[:self._n], categories=pd.Index(self._categories, dtype=object)
+            ) if self._categories else pd.Categorical([], categories=[])
+            return pd.DataFrame(data, copy=False)
+
+    def fingerprint(self):
+        """Hash of the meta and the recorded rows; equal tables give equal
+        fingerprints, so it can key caches across copies and reruns. The rows
+        are only hashed again when the version changes."""
+        if self._fingerprint is None or self._fingerprint[0] != self.version:
+            h = hashlib.blake2b(repr(self.columns).encode(), digest_size=16)
+            for c in self.columns:
+                h.update(self._data[c][:self._n].tobytes())
+            h.update(self._codes[:self._n].tobytes())
+            h.update("\x00".join(self._categories).encode())
+            self._fingerprint = (self.version, h.digest())
+        meta = repr(sorted(self.meta.items(), key=str)).encode()
+        return hashlib.blake2b(meta + self._fingerprint[1], digest_size=16).hexdigest()
+
+    def copy(self):
+        other = RecordTable(dict(self.meta), self.columns, self.text_column, len(self._codes))
+        for c in self.columns:
+            other._data[c][:] = self._data[c]
+        other._codes[:] = self._codes
+        other._stamps[:] = self._stamps
+        other._categories = list(self._categories)
+        other._category_code = dict(self._category_code)
+        other._row = dict(self._row)
+        other._n = self._n
+        other.version = self.version
+        return other
+
+
+def line_table(meta):
+    """Empty table for a profiling line, keyed by station."""
+    return RecordTable(meta, PROFILING_COLUMNS, PROFILING_TEXT)
+
+
+def sounding_table(meta):
+    """Empty table for one VES, keyed by (C1C2_val, P1P2_val); meta["Method"]
+    picks the spacing columns."""
+    columns = SOUNDING_SPACING[meta["Method"]] + ["resistance", "gfactor", "resistivity"]
+    return RecordTable(meta, columns, SOUNDING_TEXT)
@@ -0,0 +1,28 @@
+import os
+
+import pandas as pd
+
+import cli
+
+
+def test_output_names_stay_unique():
+    paths = [os.path.join("a", "day.csv"), os.path.join("b", "day.csv"), "day_2.csv", os.path.join("c", "Day.xlsx")]
+    assert cli.output_names(paths) == ["day", "day_2", "day_2_2", "Day_3"]
+
+
+def test_same_file_names_in_two_folders(tmp_path):
+    for folder, line in (("a", "N10"), ("b", "N20")):
+        (tmp_path / folder).mkdir()
+        (tmp_path / folder / "day.csv").write_text(f"line,station,resistance\n{line},5,1\n")
+    out = tmp_path / "out"
+    assert cli.main([str(tmp_path / "a"), str(tmp_path / "b"), "--out", str(out), "-j", "1"]) == 0
+    assert sorted(os.listdir(out)) == ["day.xlsx", "day_2.xlsx"]
+
+
+def test_profiling_xlsx_and_earlier_output(tmp_path):
+    pd.DataFrame({"Line": ["N10", "N10"], "Station": [5, 15],
+                  "Resistance": [1.0, 2.0]}).to_excel(tmp_path / "prof.xlsx", index=False)
+    out = tmp_path / "out"
+    assert cli.main([str(tmp_path), "--out", str(out), "-j", "1"]) == 0
+    # a rerun over the folder that now holds out/prof.xlsx leaves the export alone
+    assert cli.find_files([str(tmp_path)]) == [str(tmp_path / "prof.xlsx")]
@@ -0,0 +1,37 @@
+import openpyxl
+
+from export import create_excel
+from survey_store import line_table, sounding_table
+from workbook_import import merge_workbook, read_workbook
+
+
+def line(resistance=1.0):
+    table = line_table({"C1C2": 400.0, "P1P2": 10.0})
+    table.upsert(5.0, {"station": 5.0, "resistance": resistance, "gfactor": 2.0,
+                       "resistivity": 2 * resistance, "remarks": ""})
+    return table
+
+
+def ves(name):
+    table = sounding_table({"VES": name, "Method": "Wenner"})
+    table.upsert((None, 2.0), {"a": 2.0, "resistance": 1.0, "gfactor": 1.0, "resistivity": 1.0, "remark": ""})
+    return table
+
+
+def test_sheet_names_are_cleaned_and_kept_apart():
+    lines = {"N/10": line(), "A" * 40 + "x": line(), "A" * 40 + "y": line(2.0)}
+    soundings = {name: ves(name) for name in ["V/1", "V" * 40 + "1", "V" * 40 + "2"]}
+    book = create_excel(lines, soundings, cache=None)
+
+    names = openpyxl.load_workbook(book).sheetnames
+    assert len(names) == len({n.lower() for n in names}) == 12
+    assert all(len(n) <= 31 for n in names)
+    assert "N_10_data" in names and "Sounding_Data_V_1" in names
+
+    imported_lines, imported_soundings = read_workbook(book.getvalue())
+    # named from the meta block, not from the cleaned sheet names
+    assert list(imported_soundings) == list(soundings)
+    assert list(imported_lines) == list(lines)
+    assert "Line" not in imported_lines["N/10"].meta
+    merged_lines, _ = merge_workbook(lines, soundings, (imported_lines, imported_soundings))
+    assert list(merged_lines) == list(lines)
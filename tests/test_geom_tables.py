@@ -0,0 +1,77 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import geom_tables
+from geom_tables import CACHE_DIR, GeomRegistry, read_geom_table
+from gradient import compare_with_table, gradient_factor
+from survey_core import profiling_factor
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def table(tmp_path):
+    path = tmp_path / "geom_400.xlsx"
+    pd.DataFrame({"Line": ["N10", "N10"], "Station": [5.0, 15.0],
+                  "GeometricFactor": [12512.0, 12325.5]}).to_excel(path, index=False)
+    return path
+
+
+def test_cache_is_written_and_read_back(table):
+    first = read_geom_table(str(table))
+    assert os.path.exists(table.parent / CACHE_DIR / "geom_400" / "meta.json")
+    pd.testing.assert_frame_equal(read_geom_table(str(table)), first, check_dtype=False)
+
+
+def test_unwritable_cache_dir_reads_without_cache(table):
+    # a file where the cache folder should be: os.makedirs fails
+    (table.parent / CACHE_DIR).write_text("")
+    df = read_geom_table(str(table))
+    assert df["GeometricFactor"].tolist() == [12512.0, 12325.5]
+
+
+def test_failing_scratch_dir_reads_without_cache(table, monkeypatch):
+    def mkdtemp(*args, **kwargs):
+        raise PermissionError("read-only checkout")
+
+    monkeypatch.setattr(geom_tables.tempfile, "mkdtemp", mkdtemp)
+    df = read_geom_table(str(table))
+    assert len(df) == 2
+    assert not os.path.exists(table.parent / CACHE_DIR / "geom_400")
+
+
+def test_tabled_spread_reports_misses(table):
+    registry = GeomRegistry(str(table.parent))
+    factors = registry.factors([400.0, 400.0, 400.0, 500.0], [10.0, 10.0, 5.0, 10.0],
+                               ["N10", "N20", "N10", "N10"], [5.0, 5.0, 5.0, 5.0])
+    assert factors[0] == 12512.0
+    assert np.isnan(factors[1])  # not in the 400 m table: no guess from geometry
+    assert factors[2] > 0 and factors[3] > 0  # no table for these: geometry
+    assert profiling_factor(registry, 400.0, "N20", 5.0, 10.0) is None
+    assert profiling_factor(registry, 500.0, "N10", 5.0, 10.0) == pytest.approx(factors[3])
+
+
+def test_blank_cells_are_computed_from_geometry(tmp_path):
+    pd.DataFrame({"Line": ["N10", "N10", "N20"], "Station": [5.0, 15.0, 5.0],
+                  "GeometricFactor": [None, 12325.5, 12000.0]}).to_excel(tmp_path / "geom_400.xlsx", index=False)
+    registry = GeomRegistry(str(tmp_path))
+    expected = gradient_factor(400.0, 10.0, "N10", 5.0)
+    factors = registry.factors(400.0, 10.0, ["N10", "N10", "N30"], [5.0, 15.0, 5.0])
+    assert factors[0] == pytest.approx(expected)
+    assert factors[1] == 12325.5
+    assert np.isnan(factors[2])  # still not listed
+    assert profiling_factor(registry, 400.0, "N10", 5.0, 10.0) == pytest.approx(expected)
+    assert profiling_factor(registry, 400.0, "N30", 5.0, 10.0) is None
+
+
+def test_shipped_tables_match_the_geometry():
+    registry = GeomRegistry(REPO)
+    assert registry.spreads()
+    for c1c2 in registry.spreads():
+        diff = compare_with_table(registry.table(c1c2), c1c2).abs().dropna()
+        assert len(diff) > 1000
+        assert diff.median() < 0.005, c1c2
+        assert diff.max() < 0.05, c1c2
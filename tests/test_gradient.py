@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from gradient import GRID_OFFSETS, default_stations, gradient_factor, gradient_factors_at, gradient_grid
+
+
+def test_grid_is_memoized_and_read_only():
+    stations, factors = gradient_grid(500.0, 5.0)
+    assert gradient_grid(500.0, 5.0)[1] is factors
+    assert factors.shape == (len(GRID_OFFSETS), len(default_stations(500.0, 5.0)))
+    with pytest.raises(ValueError):
+        factors[0, 0] = 1.0
+
+
+def test_lookups_on_and_off_the_grid_agree_with_a_direct_computation():
+    lines = ["L0", "N10", "SW100", "E35", "junk", None]
+    stations = [2.5, -7.5, 12.5, 2.5, 2.5, 2.5]
+    factors = gradient_factors_at(500.0, 5.0, lines, stations)
+    for line, station, k in zip(lines, stations, factors):
+        single = gradient_factor(500.0, 5.0, line, station)
+        if single is None:
+            assert np.isnan(k)
+        else:
+            assert k == pytest.approx(single)
+    assert not np.isnan(factors[3])  # E35 is between the grid's lines
+
+
+def test_factor_on_the_base_line():
+    # P1/P2 at -5/+5 between C1/C2 at -250/+250
+    expected = 2 * np.pi / (2 / 245 - 2 / 255)
+    assert gradient_factor(500.0, 10.0, "L0", 0.0) == pytest.approx(expected)
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from inversion import forward, invert, layer_table
+
+SPACING = np.geomspace(1.0, 300.0, 20)
+
+
+def wenner_two_layer(rho1, rho2, h, a, terms=2000):
+    """Image series of a Wenner array over two layers."""
+    k = (rho2 - rho1) / (rho2 + rho1)
+    n = np.arange(1, terms + 1)[:, None]
+    x = 2 * n * h / a
+    return rho1 * (1 + 4 * (k ** n * (1 / np.sqrt(1 + x ** 2) - 1 / np.sqrt(4 + x ** 2))).sum(axis=0))
+
+
+@pytest.mark.parametrize("method,mn2", [("Schlumberger", None), ("Schlumberger", SPACING / 10),
+                                        ("Wenner", None)])
+def test_half_space_gives_its_resistivity(method, mn2):
+    # the layers all have the same resistivity, however thick
+    for rho, thickness in [([57.0], []), ([57.0, 57.0, 57.0], [2.0, 30.0])]:
+        rho_a = forward(method, np.array(rho), np.array(thickness), SPACING, mn2)
+        np.testing.assert_allclose(rho_a, 57.0, rtol=1e-3)
+
+
+@pytest.mark.parametrize("rho1,rho2", [(100.0, 10.0), (20.0, 500.0)])
+def test_two_layer_wenner_matches_the_image_series(rho1, rho2):
+    rho_a = forward("Wenner", np.array([rho1, rho2]), np.array([5.0]), SPACING)
+    np.testing.assert_allclose(rho_a, wenner_two_layer(rho1, rho2, 5.0, SPACING), rtol=1e-4)
+
+
+def test_recovers_a_three_layer_model():
+    rho, thickness = np.array([80.0, 15.0, 400.0]), np.array([4.0, 20.0])
+    mn2 = np.where(SPACING < 20, 0.5, 5.0)
+    apparent = forward("Schlumberger", rho, thickness, SPACING, mn2)
+    result = invert("Schlumberger", SPACING, apparent, mn2, layers=3)
+    assert result["converged"] and result["rms"] < 0.1
+    np.testing.assert_allclose(result["resistivity"], rho, rtol=0.02)
+    np.testing.assert_allclose(result["thickness"], thickness, rtol=0.02)
+    assert [row["top"] for row in layer_table(result)] == [0.0, 4.0, 24.0]
@@ -0,0 +1,80 @@
+import os
+import sqlite3
+
+import pytest
+
+import journal as journal_module
+from journal import Journal
+
+
+def entries(n, start=0):
+    return [{"uid": str(i)} for i in range(start, start + n)]
+
+
+def recorder(seen):
+    # an apply that stores everything, noting the uids of each batch
+    def apply(batch):
+        seen.append([e["uid"] for e in batch])
+        return [(e, 0) for e in batch], []
+    return apply
+
+
+def test_replay_feeds_batches_and_empties_the_queue(tmp_path):
+    journal = Journal(str(tmp_path))
+    journal.append(entries(5))
+    seen = []
+    applied, conflicts = journal.replay(recorder(seen), batch=2)
+    assert seen == [["0", "1"], ["2", "3"], ["4"]]
+    assert len(applied) == 5 and conflicts == []
+    assert journal.depth() == 0
+    assert os.listdir(tmp_path) == []
+
+
+def test_failing_apply_keeps_the_segment_for_the_next_replay(tmp_path):
+    journal = Journal(str(tmp_path))
+    journal.append(entries(3))
+
+    def broken(batch):
+        raise sqlite3.OperationalError("database is locked")
+
+    with pytest.raises(sqlite3.Error):
+        journal.replay(broken)
+    assert journal.depth() == 3
+    journal.append(entries(1, start=3))  # recorded while the store was down
+
+    # a fresh Journal (a restart) finds the queued entries too
+    journal = Journal(str(tmp_path))
+    assert journal.depth() == 4
+    seen = []
+    journal.replay(recorder(seen))
+    assert seen == [["0", "1", "2"], ["3"]]
+    assert journal.depth() == 0
+
+
+def test_line_cut_short_by_a_crash_is_skipped(tmp_path):
+    journal = Journal(str(tmp_path))
+    journal.append(entries(2))
+    with open(tmp_path / "active.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"uid": "2", "va')
+    seen = []
+    journal.replay(recorder(seen))
+    assert seen == [["0", "1"]]
+
+
+def test_replay_is_due_by_size_or_age(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(journal_module.time, "monotonic", lambda: clock[0])
+    journal = Journal(str(tmp_path))
+    assert not journal.due()
+    journal.append(entries(2))
+    assert not journal.due(min_entries=3, max_age=10)
+    journal.append(entries(1, start=2))
+    assert journal.due(min_entries=3, max_age=10)
+    assert not journal.due(min_entries=5, max_age=10)
+    clock[0] += 10
+    assert journal.due(min_entries=5, max_age=10)
+    journal.replay(recorder([]))
+    assert not journal.due(min_entries=1, max_age=0)
+    journal.append(entries(1, start=3))
+    # entries left over from an earlier run are due straight away
+    assert Journal(str(tmp_path)).due()
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from sounding import PI, sounding_reading, sounding_values
+
+
+# The Record Sounding handler's formulas before they moved to sounding.py
+def old_handler(method, C1C2_val, P1P2_val, resistance):
+    if method == "Schlumberger":
+        gfactor = 3.1428 * (((C1C2_val) ** 2 - (P1P2_val) ** 2) / (2 * P1P2_val))
+    elif method == "Wenner":
+        gfactor = 2 * 3.1428 * (P1P2_val)
+    else:
+        gfactor = 3.1428 * C1C2_val * (C1C2_val + 1) * (C1C2_val + 2) * (P1P2_val)
+    return float(gfactor), round(resistance * gfactor, 6)
+
+
+READINGS = [("Schlumberger", 1.5, 0.5), ("Schlumberger", 100.0, 5.0), ("Wenner", None, 2.0),
+            ("Wenner", None, 30.0), ("Dipole-Dipole", 1.0, 5.0), ("Dipole-Dipole", 4.0, 10.0)]
+
+
+def test_pi_of_the_field_sheets():
+    assert PI == 3.1428
+
+
+@pytest.mark.parametrize("method,C1C2_val,P1P2_val", READINGS)
+def test_single_reading_matches_the_old_handler(method, C1C2_val, P1P2_val):
+    gfactor, resistivity = sounding_reading(method, C1C2_val, P1P2_val, 12.345)
+    old_gfactor, old_resistivity = old_handler(method, C1C2_val, P1P2_val, 12.345)
+    assert gfactor == pytest.approx(old_gfactor, rel=1e-12)
+    assert resistivity == pytest.approx(old_resistivity, abs=1e-6)
+
+
+def test_arrays_match_the_old_handler():
+    ab2 = np.array([1.5, 3.0, 10.0, 100.0])
+    mn2 = np.array([0.5, 0.5, 1.0, 5.0])
+    resistance = np.array([10.0, 4.2, 0.75, 0.0123])
+    factors, resistivity = sounding_values("Schlumberger", resistance, ab2=ab2, mn2=mn2)
+    old = [old_handler("Schlumberger", x, y, r) for x, y, r in zip(ab2, mn2, resistance)]
+    np.testing.assert_allclose(factors, [k for k, _ in old], rtol=1e-12)
+    np.testing.assert_allclose(resistivity, [rho for _, rho in old], atol=1e-6)
+
+
+def test_zero_or_missing_spacings_give_nan():
+    factors, resistivity = sounding_values("Schlumberger", [1.0, 1.0, 1.0, 1.0, 1.0],
+                                           ab2=[0.0, 2.0, None, 1.0, 2.0], mn2=[0.5, 0.0, 0.5, 1.0, 0.5])
+    assert np.isnan(factors[:4]).all() and np.isnan(resistivity[:4]).all()  # MN/2 >= AB/2 is no sounding either
+    assert not np.isnan(factors[4])
+    factors, _ = sounding_values("Wenner", [1.0, 1.0], a=[0.0, np.nan])
+    assert np.isnan(factors).all()
+    factors, _ = sounding_values("Dipole-Dipole", [1.0, 1.0], n=[0.0, 2.0], a=[5.0, -1.0])
+    assert np.isnan(factors).all()
+    assert sounding_reading("Wenner", None, 0.0, 1.0) == (None, None)
+    assert sounding_reading("Wenner", None, 2.0, None) == (pytest.approx(4 * PI), None)
@@ -0,0 +1,80 @@
+import pytest
+
+from survey_db import SurveyDB
+from survey_store import line_table, sounding_table
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = SurveyDB(str(tmp_path / "surveys.db"))
+    yield db
+    db.close()
+
+
+def record(session, line, station, resistance):
+    lines = session[0]
+    if line not in lines:
+        lines[line] = line_table({"C1C2": 400.0})
+    lines[line].upsert(station, {"station": station, "resistance": resistance, "gfactor": 1.0,
+                                 "resistivity": resistance, "remarks": ""})
+
+
+def test_same_base_one_writer_wins(db):
+    a, b = db.load_survey("s"), db.load_survey("s")
+    record(a, "L0", 5.0, 1.0)
+    record(b, "L0", 5.0, 2.0)
+    first = db.pending("s", *a)
+    second = db.pending("s", *b)
+    assert first[0]["base"] == second[0]["base"] == 0
+
+    applied, conflicts = db.apply(first + second)
+    assert [e["writer"] for e, _ in applied] == [a[2].writer]
+    assert [e["writer"] for e in conflicts] == [b[2].writer]
+    assert db.load_survey("s")[0]["L0"].get(5.0)["resistance"] == 1.0
+    # only the losing writer hears about it, and only once
+    assert db.take_conflicts(a[2].writer) == []
+    assert db.take_conflicts(b[2].writer) == [{"survey": "s", "kind": "line", "name": "L0", "key": 5.0}]
+    assert db.take_conflicts(b[2].writer) == []
+
+
+def test_same_base_sounding_conflicts(db):
+    a, b = db.load_survey("s"), db.load_survey("s")
+    for session, r in ((a, 1.0), (b, 2.0)):
+        session[1]["V1"] = sounding_table({"VES": "V1", "Method": "Wenner"})
+        session[1]["V1"].upsert((None, 2.0), {"a": 2.0, "resistance": r, "gfactor": 1.0,
+                                              "resistivity": r, "remark": ""})
+    applied, conflicts = db.apply(db.pending("s", *a) + db.pending("s", *b))
+    assert len(applied) == 1 and len(conflicts) == 1
+    assert db.take_conflicts(b[2].writer)[0]["key"] == [None, 2.0]
+
+
+def test_writer_that_saw_the_newest_row_overwrites(db):
+    a, b = db.load_survey("s"), db.load_survey("s")
+    record(a, "L0", 5.0, 1.0)
+    assert db.sync("s", *a) == []
+    db.poll("s", *b)
+    record(b, "L0", 5.0, 2.0)
+    assert db.sync("s", *b) == []
+    assert db.load_survey("s")[0]["L0"].get(5.0)["resistance"] == 2.0
+
+
+def test_replaying_the_same_entries_stores_nothing_new(db):
+    a = db.load_survey("s")
+    record(a, "L0", 5.0, 1.0)
+    record(a, "L0", 10.0, 2.0)
+    entries = db.pending("s", *a)
+    first, _ = db.apply(entries)
+    again, conflicts = db.apply(entries)
+    assert conflicts == []
+    assert [row_id for _, row_id in again] == [row_id for _, row_id in first]
+    assert db._conn().execute("SELECT COUNT(*) FROM profiling").fetchone()[0] == 2
+
+
+def test_meta_edits_are_saved(db):
+    a = db.load_survey("s")
+    record(a, "L0", 5.0, 1.0)
+    db.sync("s", *a)
+    a[0]["L0"].meta["Client"] = "Acme"
+    record(a, "L0", 10.0, 2.0)
+    db.sync("s", *a)
+    assert db.load_survey("s")[0]["L0"].meta["Client"] == "Acme"
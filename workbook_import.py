@@ -0,0 +1,296 @@
+"""Reading exported survey workbooks back.
+
+An export (export.write_workbook) has a <line>_data sheet for every
+profiling line and a Sounding_Data[_<VES>] sheet for every VES: the survey
+info as a Field/Value block, a blank row, then the readings under a header
+row. The _graph sheets next to them only hold charts and are never read.
+Names come from the block's Line / VES field, as sheet names may be
+cleaned or cut to fit Excel.
+
+Sheets are read with python-calamine (a Rust parser, about 15x faster than
+openpyxl on an export) when it is installed, else streamed row by row with
+openpyxl read_only. read_workbook rebuilds the lines and VES of a workbook
+as RecordTables in one pass over its sheets, ready to merge into the
+session (merge_workbook); read_workbooks reads many files over a process
+pool.
+"""
+import datetime
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from field_import import sounding_keys
+from survey_store import SOUNDING_SPACING, line_table, sounding_table
+
+try:
+    import python_calamine
+except ImportError:  # openpyxl is always there (the app needs it anyway)
+    python_calamine = None
+
+ENGINES = ["calamine", "openpyxl"]
+DEFAULT_ENGINE = "calamine" if python_calamine is not None else "openpyxl"
+
+SOUNDING_SHEET = "Sounding_Data"
+LINE_SHEET_SUFFIX = "_data"
+# Meta fields stored as numbers; everything else is kept as text
+NUMERIC_META = ("Latitude", "Longitude", "C1C2", "P1P2")
+
+PARALLEL_MIN_FILES = 4  # below this the pool start-up isn't worth it
+WORKERS = min(4, os.cpu_count() or 1)
+
+
+def is_graph_sheet(name):
+    return name.endswith("_graph") or name.startswith("Sounding_Graph")
+
+
+def is_export(path):
+    """Whether a workbook looks like an export: its first sheet starts
+    with the Field/Value block."""
+    try:
+        header = pd.read_excel(path, nrows=0).columns
+    except Exception:
+        return False
+    return [str(c) for c in header[:2]] == ["Field", "Value"]
+
+
+def _cell(value):
+    # calamine gives "" for an empty cell, openpyxl None
+    return None if value == "" else value
+
+
+def _split(rows):
+    """(meta, header, data rows) of a data sheet's rows, or None when the
+    sheet doesn't start with a Field/Value block. Cells are left as read."""
+    rows = iter(rows)
+    first = next(rows, None)
+    if not first or tuple(first[:2]) != ("Field", "Value"):
+        return None
+    meta = {}
+    for row in rows:
+        if not row or all(_cell(v) is None for v in row):
+            break  # the blank row between the block and the readings
+        meta[str(row[0])] = _cell(row[1]) if len(row) > 1 else None
+    header = next(rows, None) or ()
+    width = len(header)
+    while width and _cell(header[width - 1]) is None:
+        width -= 1
+    data = []
+    for row in rows:
+        row = row[:width]
+        if row.count(None) + row.count("") < len(row):
+            data.append(row)
+    return meta, [str(c) for c in header[:width]], data
+
+
+def _frame(header, data):
+    return pd.DataFrame.from_records([[_cell(v) for v in row] for row in data], columns=header)
+
+
+def _open(source):
+    # a path, bytes (an upload) or a binary file object
+    return io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+
+
+def _calamine_sheets(source, wanted):
+    source = _open(source)
+    if isinstance(source, (str, os.PathLike)):
+        book = python_calamine.CalamineWorkbook.from_path(os.fspath(source))
+    else:
+        book = python_calamine.CalamineWorkbook.from_filelike(source)
+    try:
+        for name in book.sheet_names:
+            if wanted(name):
+                yield name, book.get_sheet_by_name(name).to_python(skip_empty_area=False)
+    finally:
+        book.close()
+
+
+def _openpyxl_sheets(source, wanted):
+    import openpyxl
+
+    book = openpyxl.load_workbook(_open(source), read_only=True, data_only=True)
+    try:
+        for sheet in book.worksheets:
+            if wanted(sheet.title):
+                yield sheet.title, sheet.iter_rows(values_only=True)
+    finally:
+        book.close()
+
+
+def _data_sheets(source, soundings, lines, engine):
+    engine = engine or DEFAULT_ENGINE
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine: {engine!r}")
+    if engine == "calamine" and python_calamine is None:
+        raise ValueError("The calamine engine needs python-calamine installed")
+
+    def wanted(name):
+        if is_graph_sheet(name):
+            return False
+        return soundings if name.startswith(SOUNDING_SHEET) else lines
+
+    sheets = _calamine_sheets if engine == "calamine" else _openpyxl_sheets
+    for name, rows in sheets(source, wanted):
+        parts = _split(rows)
+        if parts is not None:
+            yield (name, *parts)
+
+
+def iter_data_sheets(source, soundings=True, lines=True, engine=None):
+    """(sheet name, meta, DataFrame) of the data sheets of an exported
+    workbook, in workbook order. Sounding sheets are the Sounding_Data ones,
+    line sheets every other sheet with a Field/Value block."""
+    for name, meta, header, data in _data_sheets(source, soundings, lines, engine):
+        yield name, meta, _frame(header, data)
+
+
+def ves_name(sheet, meta):
+    """A sounding's VES: from its meta block, else from the sheet name."""
+    if meta.get("VES") not in (None, ""):
+        return str(meta["VES"])
+    return sheet[len(SOUNDING_SHEET) + 1:] or "VES1"
+
+
+def line_name(sheet, meta):
+    """A line's name: from its meta block (exports since it was written
+    there), else from the sheet name, which can be cleaned or cut."""
+    if meta.get("Line") not in (None, ""):
+        return str(meta["Line"])
+    # sheet names are cut at 31 characters, which can take the suffix off
+    return sheet[:-len(LINE_SHEET_SUFFIX)] if sheet.endswith(LINE_SHEET_SUFFIX) else sheet
+
+
+def read_soundings(source, engine=None):
+    """{VES: (meta, DataFrame)} of every sounding in an exported workbook."""
+    return {ves_name(sheet, meta): (meta, df)
+            for sheet, meta, df in iter_data_sheets(source, lines=False, engine=engine)}
+
+
+def _meta(meta):
+    """Meta block values as the app stores them."""
+    out = {}
+    for field, value in meta.items():
+        if field in NUMERIC_META:
+            value = pd.to_numeric(value, errors="coerce") if value is not None else np.nan
+            value = None if pd.isna(value) else float(value)
+        elif isinstance(value, (datetime.date, datetime.datetime)):
+            value = value.strftime("%d-%m-%Y")
+        elif isinstance(value, float) and value.is_integer() and field in ("VES", "Line"):
+            value = str(int(value))
+        elif value is not None:
+            value = str(value)
+        out[field] = value
+    return out
+
+
+def _numbers(values):
+    try:
+        return np.array(values, dtype=float)  # None -> nan
+    except (TypeError, ValueError):
+        return pd.to_numeric(pd.Series(values, dtype=object).replace("", None), errors="coerce").to_numpy(dtype=float)
+
+
+def _table(kind, meta, header, data):
+    """A RecordTable holding the rows of one data sheet."""
+    if kind == "sounding":
+        method = meta.get("Method")
+        if method not in SOUNDING_SPACING:
+            raise ValueError(f"Unknown sounding method {method!r}")
+        table = sounding_table(meta)
+    else:
+        table = line_table(meta)
+    if not data:
+        return table
+    missing = [c for c in table.columns if c not in header]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+    # one column at a time, straight from the rows
+    cells = list(zip(*data))
+    columns = {c: _numbers(cells[header.index(c)]) for c in table.columns}
+    text = table.text_column
+    columns[text] = cells[header.index(text)] if text in header else None
+    if kind == "sounding":
+        keys = sounding_keys(meta["Method"], columns)
+    else:
+        keys = [None if np.isnan(s) else s for s in columns["station"].tolist()]
+    table.upsert_many(keys, columns)
+    return table
+
+
+def read_workbook(source, engine=None):
+    """(lines, soundings) of an exported workbook: {name: RecordTable} each,
+    in the order they were exported. Raises ValueError for a sheet that
+    isn't in the export layout."""
+    lines, soundings = {}, {}
+    for sheet, meta, header, data in _data_sheets(source, True, True, engine):
+        meta = _meta(meta)
+        try:
+            if sheet.startswith(SOUNDING_SHEET):
+                name = ves_name(sheet, meta)
+                soundings[name] = _table("sounding", {"VES": name, **meta}, header, data)
+            else:
+                name = line_name(sheet, meta)
+                meta.pop("Line", None)  # the name is the key, as in the app
+                lines[name] = _table("line", meta, header, data)
+        except ValueError as e:
+            raise ValueError(f"sheet {sheet}: {e}") from None
+    return lines, soundings
+
+
+def _read_one(task):
+    source, engine = task
+    return read_workbook(source, engine)
+
+
+def read_workbooks(sources, engine=None, workers=WORKERS):
+    """read_workbook for many files (paths or bytes), in the order given.
+
+    From PARALLEL_MIN_FILES files on they are read in worker processes;
+    each result is either (lines, soundings) or the exception that file
+    raised, so one bad file doesn't lose the others.
+    """
+    tasks = [(source, engine) for source in sources]
+    if workers > 1 and len(tasks) >= PARALLEL_MIN_FILES:
+        # spawn, not fork: the Streamlit server process is multi-threaded
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)),
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [pool.submit(_read_one, task) for task in tasks]
+            return [_result(future.result, ()) for future in futures]
+    return [_result(_read_one, (task,)) for task in tasks]
+
+
+def _result(call, args):
+    try:
+        return call(*args)
+    except Exception as e:
+        return e
+
+
+def merge_workbook(lines, soundings, workbook):
+    """New (lines, soundings) dicts with a read_workbook result merged in.
+
+    Lines and VES not in the session are taken as they are; the readings of
+    ones already there are added to a copy of them, the workbook winning
+    for stations / spacings recorded in both. Raises ValueError when a VES
+    was recorded with another method.
+    """
+    new_lines, new_soundings = workbook
+    merged_lines, merged_soundings = dict(lines), dict(soundings)
+    for name, table in new_soundings.items():
+        current = merged_soundings.get(name)
+        if current is not None and current.meta["Method"] != table.meta["Method"]:
+            raise ValueError(f"{name} is already recorded as {current.meta['Method']}, not {table.meta['Method']}")
+    for merged, new in ((merged_lines, new_lines), (merged_soundings, new_soundings)):
+        for name, table in new.items():
+            if name in merged:
+                current = merged[name].copy()
+                columns = {c: table.column(c) for c in table.columns}
+                columns[table.text_column] = table.frame()[table.text_column].tolist()
+                current.upsert_many(table.keys(), columns)
+                table = current
+            merged[name] = table
+    return merged_lines, merged_soundings